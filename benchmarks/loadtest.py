@@ -0,0 +1,231 @@
+# loadtest.py
+# measures the latency and throughput of the lookup server (lib/server.py)
+#
+# Usage (from the folder containing stockslexicon):
+#  python -m stockslexicon.benchmarks.loadtest              # starts a server
+#  python -m stockslexicon.benchmarks.loadtest --port 8765  # running server
+#  python -m stockslexicon.benchmarks.loadtest --clients 64 --batch 100
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+import numpy as np
+from ..stocks import _DATA_FOLDER
+from ..lib import parser
+
+
+async def request(reader, writer, path, params=None, body=None):
+    """
+    Sends a request over a kept-alive connection and reads the response.
+
+    Output:
+     status: int, HTTP status code
+     payload: dictionary, json response
+    """
+    target = path + ('?' + urllib.parse.urlencode(params) if params else '')
+    data = b'' if body is None else json.dumps(body).encode('utf-8')
+    method = 'GET' if body is None else 'POST'
+    writer.write(f'{method} {target} HTTP/1.1\r\nHost: localhost\r\n'
+                 f'Content-Length: {len(data)}\r\n\r\n'.encode('latin-1')
+                 + data)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        header = await reader.readline()
+        if header in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = header.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    return (status, json.loads(await reader.readexactly(length)))
+
+
+async def connect(options):
+    if options.unix is not None:
+        return await asyncio.open_unix_connection(options.unix)
+    return await asyncio.open_connection(options.host, options.port)
+
+
+async def ping(options):
+    """
+    Checks that the server accepts connections.
+    """
+    _, writer = await asyncio.wait_for(connect(options), 1)
+    writer.close()
+    await writer.wait_closed()
+
+
+def makeQueries(path, rng, total=10000):
+    """
+    Returns company lookups: 45% tickers, 45% names and 10% unknown words.
+    """
+    names = parser.loadCompanyNames(path)
+    tickers = np.array(list(names))
+    cleared = parser.clearNames([name.replace(',', ' ')
+                                 for name in names.values()])
+    draw = rng.random(total)
+    return np.where(draw < 0.45, tickers[rng.integers(0, len(tickers), total)],
+                    np.where(draw < 0.90,
+                             cleared[rng.integers(0, len(cleared), total)],
+                             'lorem')).tolist()
+
+
+async def client(options, queries, start, latencies, errors):
+    """
+    Sends requests one after the other until the test ends.
+    """
+    reader, writer = await connect(options)
+    i = start
+    try:
+        while time.perf_counter() < options.deadline:
+            if options.batch > 1:
+                batch = [queries[(i + j) % len(queries)]
+                         for j in range(options.batch)]
+                call = request(reader, writer, '/batch',
+                               body=dict(companies=batch, years=2018))
+                i += options.batch
+            else:
+                call = request(reader, writer, f'/{options.endpoint}',
+                               {options.parameter: queries[i % len(queries)],
+                                'year': 2018})
+                i += 1
+            sent = time.perf_counter()
+            status, _ = await call
+            latencies.append(time.perf_counter() - sent)
+            if status != 200:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+async def loadTest(options, queries):
+    """
+    Runs the clients concurrently for the duration of the test.
+    """
+    latencies = []
+    errors = []
+    options.deadline = time.perf_counter() + options.duration
+    begin = time.perf_counter()
+    await asyncio.gather(*(client(options, queries, i * 997, latencies, errors)
+                           for i in range(options.clients)))
+    elapsed = time.perf_counter() - begin
+    reader, writer = await connect(options)
+    _, stats = await request(reader, writer, '/stats')
+    writer.close()
+    latencies = np.array(latencies)
+    return dict(endpoint='batch' if options.batch > 1 else options.endpoint,
+                clients=options.clients,
+                batch=options.batch,
+                requests=len(latencies),
+                errors=len(errors),
+                seconds=elapsed,
+                requests_per_second=len(latencies) / elapsed,
+                lookups_per_second=len(latencies) * options.batch / elapsed,
+                p50=float(np.percentile(latencies, 50)),
+                p99=float(np.percentile(latencies, 99)),
+                maximum=float(latencies.max()),
+                server=stats)
+
+
+def startServer(options):
+    """
+    Starts a server on a Unix socket in a child process and waits until it
+    accepts connections. The socket is in a temporary folder, removed by
+    loadtest.stopServer.
+    """
+    folder = tempfile.mkdtemp()
+    options.unix = os.path.join(folder, 'server.sock')
+    package = __package__.rsplit('.', 1)[0]
+    process = subprocess.Popen([
+        sys.executable, '-m', f'{package}.lib.server', '--unix', options.unix,
+        '--path', options.path, '--window', str(options.window)])
+    try:
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError('The server stopped before serving')
+            try:
+                asyncio.run(ping(options))
+                return process
+            except (OSError, asyncio.TimeoutError):
+                time.sleep(0.1)
+    except BaseException:
+        stopServer(options, process)
+        raise
+
+
+def stopServer(options, process):
+    """
+    Stops a server started by loadtest.startServer and removes the folder
+    of its socket.
+    """
+    process.terminate()
+    process.wait()
+    shutil.rmtree(os.path.dirname(options.unix), ignore_errors=True)
+
+
+def main():
+    arguments = argparse.ArgumentParser(description=(
+        'Sends concurrent requests to the lookup server and reports the '
+        'p50/p99 latency and the throughput. Starts a server on the data '
+        'files unless --port or --unix are given.'))
+    arguments.add_argument('--host', default='127.0.0.1',
+                           help='address of a running server')
+    arguments.add_argument('--port', type=int, default=None,
+                           help='TCP port of a running server')
+    arguments.add_argument('--unix', default=None,
+                           help='Unix socket of a running server')
+    arguments.add_argument('--path', default=_DATA_FOLDER,
+                           help='folder of the data files (for the queries, '
+                                'and for the server if one is started)')
+    arguments.add_argument('--window', type=float, default=1.0,
+                           help='batching window (milliseconds) of the '
+                                'server if one is started')
+    arguments.add_argument('--endpoint', default='generalizeCompany',
+                           choices=['generalizeCompany', 'generalizeTicker'],
+                           help='endpoint of the single lookups')
+    arguments.add_argument('--clients', type=int, default=32,
+                           help='number of concurrent connections')
+    arguments.add_argument('--batch', type=int, default=1,
+                           help='lookups per request, sent to /batch if > 1')
+    arguments.add_argument('--duration', type=float, default=10.0,
+                           help='seconds the test runs')
+    arguments.add_argument('--output', default=None,
+                           help='json file where the results are saved')
+    options = arguments.parse_args()
+    options.parameter = 'company' if options.endpoint == 'generalizeCompany' \
+        else 'ticker'
+
+    process = None
+    if options.port is None and options.unix is None:
+        process = startServer(options)
+    try:
+        queries = makeQueries(options.path, np.random.default_rng(0))
+        res = asyncio.run(loadTest(options, queries))
+    finally:
+        if process is not None:
+            stopServer(options, process)
+    print(f'{res["requests"]} requests ({res["errors"]} errors) from '
+          f'{res["clients"]} clients in {res["seconds"]:.1f} s')
+    print(f'throughput: {res["requests_per_second"]:.0f} requests/s, '
+          f'{res["lookups_per_second"]:.0f} lookups/s')
+    print(f'latency: p50 {res["p50"] * 1000:.2f} ms, '
+          f'p99 {res["p99"] * 1000:.2f} ms, '
+          f'max {res["maximum"] * 1000:.2f} ms')
+    batches = res['server']['batches'][options.endpoint]
+    if batches['batches']:
+        print(f'server batches: {batches["batches"]}, '
+              f'mean size {batches["mean_size"]:.1f}')
+    if options.output is not None:
+        with open(options.output, 'w') as output:
+            json.dump(res, output, indent=1)
+
+
+if __name__ == '__main__':
+    main()
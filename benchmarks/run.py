@@ -0,0 +1,243 @@
+# run.py
+# benchmarks loading, lookups, fuzzy search and text scanning
+#
+# Usage (from the folder containing stockslexicon):
+#  python -m stockslexicon.benchmarks.run                  # all datasets
+#  python -m stockslexicon.benchmarks.run --sizes 10000 --years 12 50
+#  python -m stockslexicon.benchmarks.run --output results.json
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import numpy as np
+from ..stocks import Stocks, _DATA_FOLDER
+from ..lib import parser
+from . import synthetic
+
+
+def measure(function, *args, repeat=5, budget=1.0):
+    """
+    Measures the running time of function(*args).
+    Calls the function in a loop long enough to be timed precisely, and
+    repeats the loop a few times (or until the time budget is spent).
+
+    Output:
+     res: dictionary, best and median seconds per call and number of calls
+    """
+    start = time.perf_counter()
+    function(*args)
+    elapsed = time.perf_counter() - start
+    number = max(1, int(0.05 / elapsed)) if elapsed > 0 else 1000
+    times = [elapsed]
+    for _ in range(repeat):
+        if time.perf_counter() - start > budget and len(times) > 1:
+            break
+        loop = time.perf_counter()
+        for _ in range(number):
+            function(*args)
+        times.append((time.perf_counter() - loop) / number)
+    return dict(best=min(times), median=float(np.median(times)),
+                calls=1 + number * (len(times) - 1))
+
+
+def makeText(stocks, words, rng):
+    """
+    Returns a text with about 5% company names and 5% tickers.
+    """
+    names = np.array(list(stocks.nameToTicker))
+    tickers = stocks.tickers
+    draw = rng.random(words)
+    text = np.where(draw < 0.05, names[rng.integers(0, len(names), words)],
+                    np.where(draw < 0.10,
+                             tickers[rng.integers(0, len(tickers), words)],
+                             'lorem'))
+    return ' '.join(text)
+
+
+def benchmarkDataset(label, path, fuzzy=True):
+    """
+    Runs all benchmarks on the data files in a folder.
+
+    Output:
+     res: list of dictionaries, one per benchmark
+    """
+    res = []
+
+    def record(benchmark, timing, **extra):
+        res.append(dict(dataset=label, benchmark=benchmark, **timing,
+                        **extra))
+        print(f'{label:>24} {benchmark:<34} {timing["best"]:.3e} s')
+
+    rng = np.random.default_rng(0)
+    record('parser.loadMarketcapYears',
+           measure(parser.loadMarketcapYears, path, repeat=2))
+    record('Stocks()', measure(Stocks, False, path, repeat=2))
+    record('Stocks(columnar=True)', measure(Stocks, True, path, repeat=2))
+    with tempfile.TemporaryDirectory() as folder:
+        filename = os.path.join(folder, 'snapshot.npz')
+        Stocks(path=path).saveSnapshot(filename)
+        record('Stocks.fromSnapshot', measure(
+            Stocks.fromSnapshot, filename, False, path, repeat=2))
+    stocks = Stocks(path=path)
+    if fuzzy:
+        stocks.buildAll()
+    else:
+        stocks.nameAutomaton    # everything but the fuzzy search index
+    for stage, seconds in stocks.buildTimes.items():
+        record(f'build {stage}', dict(best=seconds, median=seconds, calls=1))
+
+    tickers = stocks.tickers[rng.integers(0, len(stocks.tickers), 1000)]
+    names = np.array(list(stocks.nameToTicker))
+    names = names[rng.integers(0, len(names), 1000)]
+    year = str(stocks.year_end)
+    cycle = iter(range(1 << 62))
+
+    def single(method, keys):
+        return lambda: method(keys[next(cycle) % len(keys)])
+
+    record('size', measure(single(lambda t: stocks.size(t, year), tickers)))
+    record('industry', measure(single(stocks.industry, tickers)))
+    record('generalizeTicker',
+           measure(single(lambda t: stocks.generalizeTicker(t, year),
+                          tickers)))
+    # the lookups themselves, without the cache of generalizeCompany
+    stocks.setCompanyCacheSize(0)
+    record('generalizeCompany (ticker)',
+           measure(single(lambda t: stocks.generalizeCompany(t, year),
+                          tickers)))
+    record('generalizeCompany (name)',
+           measure(single(lambda n: stocks.generalizeCompany(n, year),
+                          names)))
+    record('generalizeCompany (miss)',
+           measure(lambda: stocks.generalizeCompany('lorem', year)))
+    stocks.setCompanyCacheSize(Stocks.companyCacheSize)
+    record('generalizeCompany (cached name)',
+           measure(single(lambda n: stocks.generalizeCompany(n, year),
+                          names)))
+    record('generalizeCompany (cached miss)',
+           measure(lambda: stocks.generalizeCompany('lorem', year)))
+
+    record('screen (Small, one industry)',
+           measure(lambda: stocks.screen(year, size='Small',
+                                         industry=stocks.industry(tickers[0]))))
+    record('topCompanies (100)', measure(stocks.topCompanies, year, 100))
+
+    def uncached(method, *args):
+        def call():
+            stocks._aggregates.clear()
+            return method(*args)
+        return call
+
+    record('crossTab (uncached)', measure(uncached(stocks.crossTab, year)))
+    record('crossTab (cached)', measure(stocks.crossTab, year))
+    record('sizeMigrations (uncached)', measure(uncached(
+        stocks.sizeMigrations, str(stocks.year_start), year)))
+
+    batch = stocks.tickers[rng.integers(0, len(stocks.tickers), 1000000)]
+    timing = measure(stocks.generalizeTickers, batch, year, repeat=3)
+    record('generalizeTickers (1e6)', timing,
+           per_item=timing['best'] / len(batch))
+
+    # prefixes typed in a search box, one letter matches the most companies
+    for length in (1, 3, 6):
+        prefixes = [name[:length] for name in names]
+        record(f'complete ({length} chars)',
+               measure(single(stocks.complete, prefixes)))
+
+    if fuzzy:
+        queries = [name[:-1] + 'x' for name in names[:20]]
+        record('matchNameFuzzy',
+               measure(single(stocks.matchNameFuzzy, queries), repeat=3))
+
+    if stocks.daily is not None:
+        record('build daily', dict(best=stocks.buildTimes['build_daily'],
+                                   median=stocks.buildTimes['build_daily'],
+                                   calls=1))
+        series = stocks.daily.tickers
+        dates = np.datetime64('2009-03-01') + rng.integers(0, 3000, 1000)
+        queries = series[rng.integers(0, len(series), 1000)].tolist()
+        queries = list(zip(queries, dates.astype(str).tolist()))
+        lookup = iter(range(1 << 62))
+
+        def asOf():
+            ticker, date = queries[next(lookup) % len(queries)]
+            try:
+                return stocks.sizeAsOf(ticker, date)
+            except KeyError:
+                return None     # date before the first market cap
+        record('sizeAsOf', measure(asOf))
+        record('marketcapRange (1 year)', measure(
+            stocks.marketcapRange, series[0], '2014-01-01', '2014-12-31'))
+
+    text = makeText(stocks, 100000, rng)
+    for method in (stocks.findNamesInString, stocks.generalizeString):
+        timing = measure(method, text, repeat=3)
+        record(f'{method.__name__} (100k words)', timing,
+               chars_per_second=len(text) / timing['best'])
+    return res
+
+
+def metadata():
+    """
+    Describes the machine and code being benchmarked.
+    """
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(_DATA_FOLDER.rstrip('/'))).stdout.strip()
+    except OSError:
+        commit = ''
+    return dict(time=time.strftime('%Y-%m-%dT%H:%M:%S'),
+                commit=commit,
+                python=platform.python_version(),
+                numpy=np.__version__,
+                machine=platform.machine(),
+                processor=platform.processor(),
+                cpus=os.cpu_count())
+
+
+def main():
+    arguments = argparse.ArgumentParser(description=(
+        'Benchmarks the Stocks class on the data/ folder and on synthetic '
+        'datasets, and saves the results as json if --output is given.'))
+    arguments.add_argument('--sizes', type=int, nargs='*',
+                           default=[10000, 100000, 1000000],
+                           help='number of tickers of synthetic datasets')
+    arguments.add_argument('--years', type=int, nargs='*', default=[12],
+                           help='number of years of synthetic datasets')
+    arguments.add_argument('--workdir', default=os.path.join(
+        tempfile.gettempdir(), 'stockslexicon-benchmarks'),
+        help='folder where synthetic datasets are generated (and reused)')
+    arguments.add_argument('--daily', type=int, default=0,
+                           help='business days of daily market caps of '
+                                'synthetic datasets (none by default)')
+    arguments.add_argument('--no-fuzzy', action='store_true',
+                           help='skip fuzzy search benchmarks')
+    arguments.add_argument('--output', default=None,
+                           help='json file where results are saved '
+                                '(none by default)')
+    options = arguments.parse_args()
+
+    results = benchmarkDataset('data', _DATA_FOLDER, not options.no_fuzzy)
+    for years in options.years:
+        for size in options.sizes:
+            label = f'synthetic-{size}x{years}'
+            path = os.path.join(options.workdir, label) + '/'
+            if not os.path.isfile(f'{path}marketcap-years.csv'):
+                synthetic.generateData(path, size, years)
+            if options.daily and not os.path.isfile(
+                    f'{path}marketcap-daily.csv'):
+                synthetic.generateDaily(path, size, options.daily)
+            results += benchmarkDataset(label, path, not options.no_fuzzy)
+    if options.output is not None:
+        with open(options.output, 'w') as output:
+            json.dump(dict(metadata=metadata(), results=results), output,
+                      indent=1)
+        print(f'Saved results to {options.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+# synthetic.py
+# generates synthetic data files with the same format as the data/ folder
+import os
+import numpy as np
+
+_INDUSTRIES = ['Automotive', 'Consumer Durables', 'Food & Beverage',
+               'Material & Construction', 'Insurance', 'Banking',
+               'Wholesale', 'Metals & Mining', 'Computer Software & Services',
+               'Chemicals', 'Leisure', 'Transportation', 'Telecommunications',
+               'Media', 'Electronics', 'Health Services', 'Utilities',
+               'Tobacco', 'Financial Services', 'Diversified Services',
+               'Internet', 'Retail', 'Specialty Retail', 'Conglomerates',
+               'Computer Hardware', 'Aerospace/Defense', 'Real Estate',
+               'Drugs', 'Energy', 'Consumer NonDurables', 'Manufacturing']
+_SUFFIXES = [' Inc', ' Corp', ' Group', ' Holdings Inc', ', Inc', ' Co', '']
+_SYLLABLES = ['al', 'be', 'cor', 'da', 'en', 'fi', 'gen', 'ho', 'in', 'ja',
+              'ka', 'lu', 'mi', 'no', 'or', 'pa', 'qu', 'ra', 'si', 'te',
+              'un', 've', 'wa', 'xi', 'yo', 'zen', 'tech', 'bio', 'sys', 'net']
+
+
+def tickerSymbols(total):
+    """
+    Returns total distinct ticker symbols (A, B, ..., Z, AA, AB, ...).
+    """
+    tickers = []
+    for i in range(total):
+        ticker = ''
+        i += 1
+        while i > 0:
+            i, remainder = divmod(i - 1, 26)
+            ticker = chr(ord('A') + remainder) + ticker
+        tickers.append(ticker)
+    return tickers
+
+
+def companyNames(total, rng):
+    """
+    Returns total company names made of one to three random words and a
+    suffix such as Inc or Corp.
+    """
+    syllables = np.array(_SYLLABLES)
+    words = [''.join(syllables[rng.integers(0, len(syllables), size)])
+             .capitalize() for size in rng.integers(2, 4, 3000)]
+    words = np.array(words)
+    lengths = rng.integers(1, 4, total)
+    choices = rng.integers(0, len(words), (total, 3))
+    suffixes = rng.integers(0, len(_SUFFIXES), total)
+    return [' '.join(words[choices[i, :lengths[i]]]) + _SUFFIXES[suffixes[i]]
+            for i in range(total)]
+
+
+def generateData(path, tickers=10000, years=12, year_start=2007, seed=0):
+    """
+    Writes marketcap.csv, industries.csv and marketcap-years.csv files with
+    random companies to a folder, which can be loaded with
+    Stocks(path=path).
+
+    Input:
+     path: string, folder where the files are written (ending with /)
+     tickers: int, number of companies
+     years: int, number of years of market cap data
+     year_start: int, first year of market cap data
+     seed: int, seed of the random numbers (same seed, same files)
+    """
+    os.makedirs(path, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    symbol = tickerSymbols(tickers)
+    name = companyNames(tickers, rng)
+    # market caps are roughly log-normal, from millions to trillions
+    marketcap = np.exp(rng.normal(20.5, 2.2, (tickers, years)))
+    missing = rng.random((tickers, years)) < 0.1
+    industry = rng.integers(0, len(_INDUSTRIES), tickers)
+    categorized = rng.random(tickers) < 0.97  # some have no category
+    with open(f'{path}marketcap.csv', 'w') as csv:
+        csv.write('"MARKETCAP","NAME","TICKER"\n')
+        csv.writelines(f'"{int(marketcap[i, -1])}","{name[i]}","{symbol[i]}"\n'
+                       for i in range(tickers))
+    with open(f'{path}industries.csv', 'w') as csv:
+        csv.write('"INDUSTRY_CATEGORY","TICKER"\n')
+        csv.writelines(f'"{_INDUSTRIES[industry[i]]}","{symbol[i]}"\n'
+                       for i in range(tickers) if categorized[i])
+    header = ','.join(str(year_start + j) for j in range(years))
+    values = np.char.mod('%.1f', marketcap)
+    values[missing] = ''
+    with open(f'{path}marketcap-years.csv', 'w') as csv:
+        csv.write(f'ticker,{header}\n')
+        csv.writelines(f'{symbol[i]},{",".join(values[i])}\n'
+                       for i in range(tickers))
+
+
+def generateDaily(path, tickers=10000, days=2500, start='2009-01-01', seed=0):
+    """
+    Writes a marketcap-daily.csv file with a market cap per business day for
+    the first companies of the files written by synthetic.generateData,
+    which can be looked up with Stocks.marketcapAsOf.
+
+    Input:
+     path: string, folder where the file is written (ending with /)
+     tickers: int, number of companies
+     days: int, number of business days of market cap data
+     start: string, first day (YYYY-MM-DD)
+     seed: int, seed of the random numbers (same seed, same file)
+    """
+    os.makedirs(path, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    dates = np.busday_offset(start, np.arange(days), roll='forward')
+    dates = dates.astype(str)
+    with open(f'{path}marketcap-daily.csv', 'w') as csv:
+        csv.write('"TICKER","DATE","MARKETCAP"\n')
+        for symbol in tickerSymbols(tickers):
+            # random walk around a log-normal starting market cap
+            marketcap = np.exp(rng.normal(20.5, 2.2)
+                               + np.cumsum(rng.normal(0, 0.02, days)))
+            csv.writelines(f'{symbol},{date},{value}\n' for date, value in
+                           zip(dates, marketcap.astype(np.int64).tolist()))
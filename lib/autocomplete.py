@@ -0,0 +1,132 @@
+# autocomplete.py
+# prefix index completing partial company names and tickers, best ranked
+# first (see Stocks.complete)
+import bisect
+import re
+import numpy as np
+from .columnar import StringPool
+
+# keys per block of the index, the block minima let a query skip blocks
+# whose best key cannot be among the completions
+BLOCK = 64
+
+_SPACES = re.compile(r'\s+')
+# above every character, so that prefix + _LAST follows all keys with prefix
+_LAST = chr(0x10ffff)
+
+
+def normalizePrefix(text):
+    """
+    Returns the key of a name or a partial name: case folded, with runs of
+    whitespace replaced by one space and no leading whitespace (a trailing
+    space is kept, 'apple ' does not complete to 'applebee').
+    """
+    return _SPACES.sub(' ', text.casefold()).lstrip()
+
+
+class PrefixIndex:
+    """
+    Finds the values (e.g.: rows of companies) with a key starting with a
+    prefix, best ranked first. The keys are sorted, so that the keys with
+    a prefix are a range found by bisection, and stored in a StringPool
+    (see lib/columnar.py). The best keys of a range are found from the
+    minimum rank of each block of BLOCK keys: the k best keys are in the k
+    blocks with the best minima, or in the partial blocks at the ends of
+    the range. A query reads O(log n + range / BLOCK + k * BLOCK) values,
+    not the whole range.
+    Lookups only read, so they are safe from many threads.
+
+    Example:
+     index = PrefixIndex(['apple', 'aapl', 'applied'], [0, 0, 1], [0, 1])
+     index.complete('ap')  # [0, 1]
+    """
+
+    def __init__(self, keys, values, ranks, block=BLOCK):
+        """
+        Input:
+         keys: list of strings, keys already normalized
+               (see autocomplete.normalizePrefix)
+         values: list or numpy array of ints, value of each key, a value
+                 may have several keys
+         ranks: list or numpy array of ints, rank of each value
+                (lower is better)
+         block: int, keys per block
+        """
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        self._keys = StringPool.fromStrings([keys[i] for i in order])
+        self._values = np.asarray(values, dtype=np.int64)[order]
+        # unique ranks of the keys, by rank of their value then by key, so
+        # that the k best keys are well defined
+        rank = np.asarray(ranks, dtype=np.int64)[self._values]
+        byRank = np.lexsort((np.arange(len(order)), rank))
+        self._ranks = np.empty(len(order), dtype=np.int64)
+        self._ranks[byRank] = np.arange(len(order))
+        self._block = block
+        padded = np.full(-(-len(order) // block) * block,
+                         np.iinfo(np.int64).max)
+        padded[:len(order)] = self._ranks
+        self._blockMin = padded.reshape(-1, block).min(axis=1)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __repr__(self):
+        return f'PrefixIndex({len(self)} keys, {len(self._keys.data)} bytes)'
+
+    def range(self, prefix):
+        """
+        Returns the first and last + 1 position of the sorted keys starting
+        with a prefix (already normalized).
+        """
+        return (bisect.bisect_left(self._keys, prefix),
+                bisect.bisect_left(self._keys, prefix + _LAST))
+
+    def __best__(self, start, stop, k):
+        """
+        Returns the positions of the k best ranked keys between two
+        positions, best first.
+        """
+        block = self._block
+        first, last = -(-start // block), stop // block
+        if last - first <= k:
+            positions = np.arange(start, stop)
+        else:
+            # whole blocks inside the range with the k best minima
+            blocks = first + np.argpartition(
+                self._blockMin[first:last], k - 1)[:k]
+            positions = np.concatenate([
+                np.arange(start, first * block),
+                (blocks[:, None] * block + np.arange(block)).ravel(),
+                np.arange(last * block, stop)])
+        ranks = self._ranks[positions]
+        if len(positions) > k:
+            best = np.argpartition(ranks, k - 1)[:k]
+            positions, ranks = positions[best], ranks[best]
+        return positions[np.argsort(ranks)]
+
+    def complete(self, prefix, k=10):
+        """
+        Returns the k best ranked values with a key starting with a prefix,
+        each value once.
+
+        Input:
+         prefix: string, prefix already normalized
+                 (see autocomplete.normalizePrefix)
+         k: int, maximum number of values returned
+
+        Output:
+         values: list of ints, best ranked first
+        """
+        start, stop = self.range(prefix)
+        if k <= 0 or start == stop:
+            return []
+        # the name, legal name and ticker of a company often share a prefix
+        wanted = 2 * k
+        while True:
+            values = self._values[self.__best__(start, stop, wanted)]
+            # a value matched by several keys is kept at its best key
+            _, unique = np.unique(values, return_index=True)
+            if len(unique) >= k or wanted >= stop - start:
+                return values[np.sort(unique)[:k]].tolist()
+            wanted = min(2 * wanted + len(values) - len(unique),
+                         stop - start)
@@ -0,0 +1,150 @@
+# automaton.py
+# multi-pattern search of company names in text (Aho-Corasick)
+
+
+def _isWordChar(char):
+    """
+    Returns True if the character is part of a word (letter or digit).
+    """
+    return char.isalnum()
+
+
+class NameAutomaton:
+    """
+    Aho-Corasick automaton built over a set of company names.
+
+    Scans a string once and reports every company name found in it,
+    keeping only matches that start and end at word boundaries. Overlapping
+    matches are resolved leftmost-longest: among matches that overlap, the
+    one starting first wins and, for the same start, the longest one wins.
+
+    Example:
+     automaton = NameAutomaton({'Apple': 'AAPL', 'Apple Hospitality': 'APLE'})
+     automaton.findAll('Apple Hospitality beat Apple')
+     # [(slice(0, 17), 'APLE'), (slice(23, 28), 'AAPL')]
+    """
+
+    def __init__(self, patterns):
+        """
+        Builds the automaton.
+
+        Input:
+         patterns: dictionary, maps company names (string) to a value
+                   reported when the name is found (e.g.: its ticker)
+        """
+        self._goto = [{}]       # transitions of each node
+        self._fail = [0]        # failure link of each node
+        self._output = [None]   # (length, value) of the name ending at node
+        self._link = [0]        # closest suffix node with an output
+        for pattern, value in patterns.items():
+            if pattern:         # empty names would match everywhere
+                self.__insert__(pattern, value)
+        self.__build_links__()
+
+    def __len__(self):
+        return sum(1 for output in self._output if output is not None)
+
+    def __insert__(self, pattern, value):
+        """
+        Adds a name to the trie of the automaton.
+        """
+        node = 0
+        for char in pattern:
+            nxt = self._goto[node].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(None)
+                self._link.append(0)
+            node = nxt
+        self._output[node] = (len(pattern), value)
+
+    def __build_links__(self):
+        """
+        Computes failure and output links with a breadth first traversal.
+        """
+        goto, fail, output, link = (self._goto, self._fail,
+                                    self._output, self._link)
+        queue = list(goto[0].values())
+        for node in queue:
+            for char, child in goto[node].items():
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                fail[child] = goto[state].get(char, 0)
+                # closest proper suffix of child that is a complete name
+                suffix = fail[child]
+                link[child] = suffix if output[suffix] is not None \
+                    else link[suffix]
+                queue.append(child)
+
+    def __iter_matches__(self, string):
+        """
+        Yields (start, stop, value) for every name found in the string that
+        respects word boundaries, overlapping matches included.
+        """
+        goto, fail, output, link = (self._goto, self._fail,
+                                    self._output, self._link)
+        last = len(string)
+        node = 0
+        for i, char in enumerate(string):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            match = node if output[node] is not None else link[node]
+            if not match:
+                continue
+            stop = i + 1
+            if stop < last and _isWordChar(string[stop]) \
+               and _isWordChar(char):
+                continue        # name ends in the middle of a word
+            while match:
+                length, value = output[match]
+                start = stop - length
+                if start == 0 or not _isWordChar(string[start - 1]) \
+                   or not _isWordChar(string[start]):
+                    yield (start, stop, value)
+                match = link[match]
+
+    def findAll(self, string):
+        """
+        Finds all non-overlapping names in a string.
+
+        Input:
+         string: string, text where names are searched
+
+        Output:
+         result: list of tuples (slice, value) sorted by position, where
+                 string[slice] is the name found and value is the value
+                 associated with that name when the automaton was built
+        """
+        found = sorted(self.__iter_matches__(string),
+                       key=lambda match: (match[0], -match[1]))
+        result = []
+        end = 0
+        for start, stop, value in found:
+            if start >= end:
+                result.append((slice(start, stop), value))
+                end = stop
+        return result
+
+    def findFirst(self, string):
+        """
+        Finds the leftmost-longest name in a string.
+
+        Input:
+         string: string, text where names are searched
+
+        Output:
+         result: tuple (slice, value) or None if no name is found
+        """
+        best = None
+        for start, stop, value in self.__iter_matches__(string):
+            if best is None or start < best[0] or \
+               (start == best[0] and stop > best[1]):
+                best = (start, stop, value)
+        if best is None:
+            return None
+        return (slice(best[0], best[1]), best[2])
@@ -0,0 +1,163 @@
+# columnar.py
+# compact storage of the company data in arrays instead of dictionaries
+from collections.abc import Mapping
+import numpy as np
+
+
+class StringPool:
+    """
+    Immutable sequence of strings packed in a single buffer.
+
+    The strings are stored utf-8 encoded one after the other in one bytes
+    object, and an array of offsets marks where each string starts and
+    ends: string i is data[offsets[i]:offsets[i + 1]].
+    This takes about one byte per character plus 8 bytes per string,
+    instead of the fixed width of numpy string arrays (4 bytes per
+    character of the longest string) or the overhead of Python strings.
+    """
+
+    def __init__(self, data, offsets):
+        """
+        Input:
+         data: bytes, utf-8 encoded strings one after the other
+         offsets: numpy array of ints, len(offsets) = number of strings + 1
+        """
+        self.data = data
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+
+    @classmethod
+    def fromStrings(cls, strings):
+        """
+        Packs a sequence of strings into a pool.
+
+        Input:
+         strings: list or numpy array of strings
+        """
+        encoded = [str(string).encode('utf-8') for string in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(string) for string in encoded], out=offsets[1:])
+        return cls(b''.join(encoded), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('StringPool index out of range')
+        return self.data[self.offsets[i]:self.offsets[i + 1]].decode('utf-8')
+
+    def __iter__(self):
+        data = self.data.decode('utf-8') if self.data.isascii() else None
+        bounds = self.offsets.tolist()
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            # ascii strings have one byte per character: slice the text
+            yield data[start:stop] if data is not None \
+                else self.data[start:stop].decode('utf-8')
+
+    def __repr__(self):
+        return f'StringPool({len(self)} strings, {len(self.data)} bytes)'
+
+    def toList(self):
+        """
+        Returns the strings of the pool as a list.
+        """
+        return list(self)
+
+    def updated(self, changes):
+        """
+        Returns a new pool with some strings replaced or appended, the
+        unchanged strings are copied in bulk.
+
+        Input:
+         changes: dictionary, maps positions to their new string, positions
+                  from len(self) on are appended (without gaps)
+        """
+        lengths = np.diff(self.offsets)
+        appended = max(max(changes, default=-1) + 1 - len(lengths), 0)
+        lengths = np.concatenate([lengths, np.zeros(appended, dtype=np.int64)])
+        pieces = []
+        start = 0               # position in self.data copied up to
+        for i in sorted(changes):
+            encoded = str(changes[i]).encode('utf-8')
+            if i < len(self):
+                pieces.append(self.data[start:self.offsets[i]])
+                start = self.offsets[i + 1]
+            else:
+                pieces.append(self.data[start:])
+                start = len(self.data)
+            pieces.append(encoded)
+            lengths[i] = len(encoded)
+        pieces.append(self.data[start:])
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return StringPool(b''.join(pieces), offsets)
+
+
+def readField(stocks, row, field):
+    """
+    Reads a field of a company from the columns of Stocks
+    (see Stocks.__call__ for the fields).
+
+    Input:
+     stocks: instance of Stocks
+     row: int, row of the company in the columns
+     field: string, a year (e.g.: '2007'), 'legal_name', 'name' or 'industry'
+    """
+    column = stocks.yearToColumn.get(field)
+    if column is not None:
+        return stocks.marketcaps[row, column]
+    elif field == 'legal_name':
+        return stocks.legalNames[row]
+    elif field == 'name':
+        return stocks.names[row]
+    elif field == 'industry':
+        return str(stocks.industryLabels[stocks.industryCodes[row]])
+    raise KeyError(field)
+
+
+class CompanyView(Mapping):
+    """
+    Read-only dictionary with the contents of a single company,
+    with the same keys as the dictionaries in Stocks.contents
+    (one key per year plus legal_name, name and industry).
+    Values are read from the arrays of the columnar storage.
+    """
+
+    def __init__(self, stocks, row):
+        self._stocks = stocks
+        self._row = row
+
+    def __getitem__(self, field):
+        return readField(self._stocks, self._row, field)
+
+    def __iter__(self):
+        yield from self._stocks.years
+        yield from ('legal_name', 'name', 'industry')
+
+    def __len__(self):
+        return len(self._stocks.years) + 3
+
+
+class ContentsView(Mapping):
+    """
+    Read-only replacement of the Stocks.contents dictionary for the columnar
+    storage: maps ticker symbols to a CompanyView of each company, which are
+    created on demand instead of being kept in memory.
+    """
+
+    def __init__(self, stocks):
+        self._stocks = stocks
+
+    def __getitem__(self, ticker):
+        return CompanyView(self._stocks, self._stocks.tickerToRow[ticker])
+
+    def __iter__(self):
+        return iter(self._stocks.tickers.tolist())
+
+    def __len__(self):
+        return len(self._stocks.tickers)
+
+    def __contains__(self, ticker):
+        return ticker in self._stocks.tickerToRow
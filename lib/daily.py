@@ -0,0 +1,277 @@
+# daily.py
+# daily market caps stored in compressed chunks, memory mapped from disk
+# and decompressed on demand (see Stocks.marketcapAsOf)
+import bisect
+import datetime
+import functools
+import json
+import os
+import tempfile
+import zlib
+import numpy as np
+from . import snapshot
+
+# source of the daily market caps (see parser.loadMarketcapDaily)
+SOURCE = 'marketcap-daily.csv'
+
+# points (days) of a ticker per chunk, the unit of decompression
+CHUNK = 1024
+
+# decompressed chunks kept in memory (see DailySeries)
+CACHE = 256
+
+# version of the files saved by daily.saveDaily, those of other versions are
+# saved again (2: without missing market caps)
+FORMAT = 2
+
+# ordinal (see datetime.date.toordinal) of 1970-01-01
+_EPOCH = datetime.date(1970, 1, 1).toordinal()
+
+
+def toDay(date):
+    """
+    Converts a date (string as YYYY-MM-DD, datetime.date or numpy
+    datetime64) to days since 1970-01-01.
+    """
+    # several times faster than numpy for a single date
+    if isinstance(date, str):
+        return datetime.date.fromisoformat(date).toordinal() - _EPOCH
+    if isinstance(date, datetime.date):
+        return date.toordinal() - _EPOCH
+    return int(np.datetime64(date, 'D').astype(np.int64))
+
+
+def _shuffle(values):
+    """
+    Groups the bytes of an array by position (all first bytes, then all
+    second bytes, ...). The high bytes of small deltas are mostly equal,
+    so they compress much better grouped.
+    """
+    return values.view(np.uint8).reshape(-1, values.itemsize).T.tobytes()
+
+
+def _unshuffle(data, dtype, count):
+    """
+    Reverses daily._shuffle for count values of a dtype.
+    """
+    itemsize = np.dtype(dtype).itemsize
+    grouped = np.frombuffer(data, dtype=np.uint8).reshape(itemsize, count)
+    return np.ascontiguousarray(grouped.T).view(dtype).ravel()
+
+
+def _encode(day, marketcap):
+    """
+    Compresses the days and market caps of a chunk: both are stored as
+    differences with the previous value, shuffled and compressed with zlib.
+    """
+    return zlib.compress(
+        _shuffle(np.diff(day, prepend=0).astype(np.int32))
+        + _shuffle(np.diff(marketcap, prepend=0).astype(np.int64)))
+
+
+def _decode(data, count):
+    """
+    Decompresses a chunk of count points (see daily._encode).
+
+    Output:
+     day: numpy array of int32, days since 1970-01-01, increasing
+     marketcap: numpy array of int64, market caps in dollars
+    """
+    data = zlib.decompress(data)
+    split = 4 * count
+    return (np.cumsum(_unshuffle(data[:split], np.int32, count),
+                      dtype=np.int32),
+            np.cumsum(_unshuffle(data[split:], np.int64, count)))
+
+
+def saveDaily(filename, tickers, code, day, marketcap, path='data/'):
+    """
+    Saves daily market caps in compressed chunks of CHUNK points per
+    ticker: the chunks to filename.npy, and their index with the
+    fingerprint of the source file (see lib/snapshot.py) to filename.npz.
+    A ticker with several market caps the same day keeps the last one.
+    Missing market caps (stored as 0) are left out, so that lookups find
+    the last market cap available (see DailySeries.asOf).
+
+    Input:
+     filename: string, path of the files without extension
+     tickers, code, day, marketcap: see parser.loadMarketcapDaily
+     path: string, path to folder containing the source csv file
+    """
+    available = marketcap != 0
+    code, day = code[available], day[available]
+    marketcap = marketcap[available]
+    order = np.lexsort((day, code))     # stable, by ticker then day
+    code, day, marketcap = code[order], day[order], marketcap[order]
+    last = np.ones(len(code), dtype=bool)
+    last[:-1] = (code[1:] != code[:-1]) | (day[1:] != day[:-1])
+    code, day, marketcap = code[last], day[last], marketcap[last]
+
+    present = np.unique(code)
+    bounds = np.searchsorted(code, np.append(present, len(tickers)))
+    chunks, first, counts, seriesChunks = [], [], [], [0]
+    for start, stop in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+        for begin in range(start, stop, CHUNK):
+            end = min(begin + CHUNK, stop)
+            chunks.append(_encode(day[begin:end], marketcap[begin:end]))
+            first.append(day[begin])
+            counts.append(end - begin)
+        seriesChunks.append(len(chunks))
+    offsets = np.zeros(len(chunks) + 1, dtype=np.int64)
+    np.cumsum([len(chunk) for chunk in chunks], out=offsets[1:])
+
+    # the chunks first: a reader seeing them with the previous index finds
+    # a different size and ignores the files
+    folder = os.path.dirname(os.path.abspath(filename))
+    for suffix, write in (
+            ('.npy', lambda f: np.save(f, np.frombuffer(
+                b''.join(chunks), dtype=np.uint8))),
+            ('.npz', lambda f: np.savez(
+                f, format=FORMAT, tickers=tickers[present],
+                seriesChunks=seriesChunks,
+                first=np.array(first, dtype=np.int32),
+                counts=np.array(counts, dtype=np.int32), offsets=offsets,
+                fingerprint=np.array(json.dumps(snapshot.fingerprint(
+                    path, (SOURCE,))))))):
+        with tempfile.NamedTemporaryFile(dir=folder, suffix=suffix,
+                                         delete=False) as f:
+            try:
+                write(f)
+            except BaseException:
+                os.unlink(f.name)
+                raise
+        os.replace(f.name, f'{filename}{suffix}')
+
+
+def loadDaily(filename, path='data/'):
+    """
+    Opens daily market caps saved by daily.saveDaily, as long as the source
+    file did not change since they were saved, by the same version
+    (see daily.FORMAT). The chunks are memory mapped,
+    only the index is read.
+
+    Input:
+     filename: string, path of the files without extension
+     path: string, path to folder containing the source csv file
+
+    Output:
+     series: DailySeries or None if the files are missing, stale or of
+             another version
+    """
+    try:
+        with np.load(f'{filename}.npz', allow_pickle=False) as index:
+            if int(index['format']) != FORMAT or not snapshot.isFresh(
+                    json.loads(str(index['fingerprint'])), path, (SOURCE,)):
+                return None
+            arrays = {key: index[key] for key in index.files
+                      if key not in ('format', 'fingerprint')}
+        chunks = np.load(f'{filename}.npy', mmap_mode='r')
+    except (OSError, ValueError, KeyError, EOFError):
+        return None
+    if len(chunks) != arrays['offsets'][-1]:
+        return None
+    return DailySeries(arrays, chunks)
+
+
+class DailySeries:
+    """
+    Daily market caps of many tickers, read from compressed chunks
+    (see daily.saveDaily) that are decompressed when first needed and kept
+    in a bounded cache. Only the index of the chunks (first day and
+    position of each) is held in memory.
+    Lookups only read, so they are safe from many threads.
+
+    Example:
+     series = loadDaily('data/marketcap-daily')
+     series.asOf('AAPL', '2015-06-30')  # market cap on (or before) the date
+     days, marketcaps = series.read('AAPL', '2015-01-01', '2015-12-31')
+    """
+
+    def __init__(self, arrays, chunks, cache=CACHE):
+        """
+        Input:
+         arrays: dictionary, index of the chunks (see daily.saveDaily)
+         chunks: numpy array of uint8, compressed chunks one after another
+         cache: int, decompressed chunks kept in memory
+        """
+        self.tickers = arrays['tickers']
+        self.tickerToSeries = {t: i for i, t in
+                               enumerate(self.tickers.tolist())}
+        self._seriesChunks = arrays['seriesChunks'].tolist()
+        # first day of each chunk, a list since bisect is faster on lists
+        # than numpy for a single lookup
+        self._first = arrays['first'].tolist()
+        self._counts = arrays['counts']
+        self._offsets = arrays['offsets']
+        self._chunks = chunks
+        self._chunk = functools.lru_cache(cache)(self.__decode_chunk__)
+
+    def __len__(self):
+        return int(self._counts.sum())
+
+    def __repr__(self):
+        return (f'DailySeries({len(self.tickers)} tickers, {len(self)} days, '
+                f'{len(self._chunks)} bytes)')
+
+    def __decode_chunk__(self, chunk):
+        start, stop = self._offsets[chunk], self._offsets[chunk + 1]
+        return _decode(self._chunks[start:stop].tobytes(),
+                       int(self._counts[chunk]))
+
+    def __chunks__(self, ticker):
+        """
+        Returns the first and last + 1 chunk of a ticker.
+        """
+        series = self.tickerToSeries[ticker]
+        return (self._seriesChunks[series], self._seriesChunks[series + 1])
+
+    def asOf(self, ticker, date):
+        """
+        Returns the market cap of a ticker on a date, or on the last date
+        before it with a market cap. Raises KeyError if the ticker is unknown
+        or has no market cap on or before the date.
+
+        Input:
+         ticker: string, ticker symbol (e.g.: 'AAPL')
+         date: string (YYYY-MM-DD), datetime.date or numpy datetime64
+
+        Output:
+         marketcap: int, market cap in dollars
+        """
+        start, stop = self.__chunks__(ticker)
+        day = toDay(date)
+        chunk = bisect.bisect_right(self._first, day, start, stop) - 1
+        if chunk < start:
+            raise KeyError(date)
+        days, marketcaps = self._chunk(chunk)
+        return int(marketcaps[days.searchsorted(day, side='right') - 1])
+
+    def read(self, ticker, start=None, end=None):
+        """
+        Returns the market caps of a ticker between two dates (included),
+        decompressing only the chunks that hold them.
+
+        Input:
+         ticker: string, ticker symbol (e.g.: 'AAPL')
+         start, end: dates (see DailySeries.asOf) or None for no bound
+
+        Output:
+         dates: numpy array of datetime64[D]
+         marketcaps: numpy array of int64, market caps in dollars
+        """
+        first, stop = self.__chunks__(ticker)
+        low = -np.inf if start is None else toDay(start)
+        high = np.inf if end is None else toDay(end)
+        # the chunk holding the start may begin before it
+        begin = max(bisect.bisect_right(self._first, low, first, stop) - 1,
+                    first)
+        last = bisect.bisect_right(self._first, high, first, stop)
+        parts = [self._chunk(chunk) for chunk in range(begin, last)]
+        if not parts:
+            return (np.zeros(0, dtype='datetime64[D]'),
+                    np.zeros(0, dtype=np.int64))
+        days = np.concatenate([part[0] for part in parts])
+        marketcaps = np.concatenate([part[1] for part in parts])
+        keep = slice(np.searchsorted(days, low, side='left'),
+                     np.searchsorted(days, high, side='right'))
+        return (days[keep].astype('datetime64[D]'), marketcaps[keep])
@@ -0,0 +1,108 @@
+# frames.py
+# export of the company data to pandas and pyarrow, and bulk joins of the
+# ticker columns of other tables with the companies (see Stocks.toColumns)
+# pandas and pyarrow are optional, they are imported only when used
+import numpy as np
+
+
+def _library(column):
+    """
+    Returns the library a column comes from: 'pandas', 'pyarrow' or None.
+    """
+    library = type(column).__module__.split('.')[0]
+    return library if library in ('pandas', 'pyarrow') else None
+
+
+def _gather(rows, codes):
+    """
+    Returns the rows of the values of a categorical column from the rows of
+    its categories, where a code of -1 (missing value) gives -1.
+    """
+    return np.append(rows, -1)[codes]
+
+
+def tickerRows(stocks, tickers):
+    """
+    Finds the row of each ticker of a column in the columns of Stocks
+    (see Stocks.joinTickers). Categorical columns (pandas category,
+    pyarrow dictionary) are joined on their categories only.
+
+    Input:
+     stocks: instance of Stocks
+     tickers: list, numpy array, pandas Series, Index or Categorical, or
+              pyarrow Array or ChunkedArray of strings
+
+    Output:
+     rows: numpy array of int64, row of each ticker (-1 where unknown)
+    """
+    library = _library(tickers)
+    if library == 'pandas':
+        import pandas as pd
+        index = pd.Index(stocks.tickers)
+        if isinstance(tickers.dtype, pd.CategoricalDtype):
+            categorical = pd.Categorical(tickers)
+            return _gather(index.get_indexer(categorical.categories),
+                           categorical.codes)
+        return index.get_indexer(tickers)   # hash join
+    if library == 'pyarrow':
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        if isinstance(tickers, pa.ChunkedArray):
+            tickers = tickers.combine_chunks()
+        if isinstance(tickers, pa.DictionaryArray):
+            codes = pc.fill_null(tickers.indices, -1).to_numpy()
+            return _gather(tickerRows(stocks, tickers.dictionary), codes)
+        rows = pc.index_in(tickers, value_set=pa.array(stocks.tickers))
+        return pc.fill_null(rows, -1).to_numpy().astype(np.int64)
+    rows, found = stocks.__rows_of_tickers__(np.asarray(tickers, dtype=str))
+    return np.where(found, rows, -1)
+
+
+def _arrowStrings(pool):
+    """
+    Wraps a StringPool (see lib/columnar.py) as a pyarrow array of strings
+    without copying, since both store offsets and utf-8 bytes.
+    """
+    import pyarrow as pa
+    return pa.Array.from_buffers(
+        pa.large_string(), len(pool),
+        [None, pa.py_buffer(pool.offsets), pa.py_buffer(pool.data)])
+
+
+def toDataFrame(stocks):
+    """
+    Returns the columns of Stocks (see Stocks.toColumns) as a pandas
+    DataFrame, one row per ticker, with the industry as a categorical
+    column. The market caps share memory with stocks, the strings are
+    converted to Python objects.
+    """
+    import pandas as pd
+    columns = stocks.toColumns()
+    data = dict(
+        ticker=columns.pop('ticker'),
+        legal_name=columns.pop('legal_name').toList(),
+        name=columns.pop('name').toList(),
+        industry=pd.Categorical.from_codes(columns.pop('industry'),
+                                           stocks.industryLabels))
+    data.update(columns)
+    return pd.DataFrame(data, copy=False)
+
+
+def toArrow(stocks):
+    """
+    Returns the columns of Stocks (see Stocks.toColumns) as a pyarrow
+    Table, one row per ticker, with the industry as a dictionary column.
+    The names are wrapped without copying, the market caps of each year
+    are copied once since they are strided views of a row-major matrix.
+    """
+    import pyarrow as pa
+    columns = stocks.toColumns()
+    data = dict(
+        ticker=pa.array(columns.pop('ticker')),
+        legal_name=_arrowStrings(columns.pop('legal_name')),
+        name=_arrowStrings(columns.pop('name')),
+        industry=pa.DictionaryArray.from_arrays(
+            columns.pop('industry'), pa.array(stocks.industryLabels)))
+    data.update((year, pa.array(np.ascontiguousarray(marketcap)))
+                for year, marketcap in columns.items())
+    return pa.table(data)
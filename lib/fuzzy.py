@@ -0,0 +1,154 @@
+# fuzzy.py
+# fuzzy search of company names pruned by an inverted index of trigrams
+import heapq
+import numpy as np
+
+# Scores above this bound can only come from the plain and token ratios of
+# fuzzywuzzy's WRatio (partial ratios are scaled to at most 90), which lets
+# the index discard names without scoring them
+_PRUNING_THRESHOLD = 90
+
+
+def _trigrams(processed):
+    """
+    Returns the set of trigrams (3 consecutive characters) of a processed
+    string and of its sorted tokens, padded with spaces so that words of
+    one or two letters also produce trigrams.
+    """
+    grams = set()
+    for string in (processed, ' '.join(sorted(processed.split()))):
+        padded = f' {string} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class NgramIndex:
+    """
+    Inverted index mapping trigrams to the names containing them, used to
+    shortlist the names worth scoring in a fuzzy search.
+
+    Names are scored with fuzzywuzzy's WRatio, as in process.extractOne.
+    For thresholds above 90 only names that can reach the threshold are
+    scored: names sharing at least one trigram with the query (a ratio
+    above 0.89 between two strings implies a common substring of 3
+    characters) and whose length is within a factor of 1.5 of the query.
+    Lower thresholds fall back to scoring every name. Either way, the names
+    scoring at least the threshold are the same as with an exhaustive scan.
+
+    Example:
+     index = NgramIndex(['Apple', 'Microsoft', 'Alphabet'])
+     index.extract('Microsfot', limit=1, threshold=80)  # [('Microsoft', 89)]
+    """
+
+    def __init__(self, names):
+        """
+        Builds the index.
+
+        Input:
+         names: list or numpy array of strings, names to be searched
+        """
+        from fuzzywuzzy import fuzz, utils
+        self._score = fuzz.WRatio
+        self._process = utils.full_process
+        self.names = [str(name) for name in names]
+        # WRatio compares the names after processing them like this
+        processed = [self._process(name, force_ascii=True)
+                     for name in self.names]
+        self._lengths = np.array([len(name) for name in processed])
+        postings = dict()
+        for i, name in enumerate(processed):
+            for gram in _trigrams(name):
+                postings.setdefault(gram, []).append(i)
+        self._postings = {gram: np.array(rows, dtype=np.int32)
+                          for gram, rows in postings.items()}
+
+    def __len__(self):
+        return len(self.names)
+
+    def updated(self, changes):
+        """
+        Returns a new index with some names replaced or appended. Only the
+        postings of the trigrams of those names are rebuilt, the rest are
+        shared with this index (which is left unchanged).
+
+        Input:
+         changes: dictionary, maps positions to their new name, positions
+                  from len(self) on are appended (without gaps)
+        """
+        index = NgramIndex.__new__(NgramIndex)
+        index._score = self._score
+        index._process = self._process
+        index.names = list(self.names)
+        lengths = self._lengths.tolist()
+        removed = dict()        # trigram -> positions leaving its postings
+        added = dict()          # trigram -> positions joining its postings
+        for i in sorted(changes):
+            if i < len(self.names):
+                for gram in _trigrams(self._process(self.names[i],
+                                                    force_ascii=True)):
+                    removed.setdefault(gram, []).append(i)
+            processed = self._process(str(changes[i]), force_ascii=True)
+            for gram in _trigrams(processed):
+                added.setdefault(gram, []).append(i)
+            if i < len(index.names):
+                index.names[i] = str(changes[i])
+                lengths[i] = len(processed)
+            else:
+                index.names.append(str(changes[i]))
+                lengths.append(len(processed))
+        index._lengths = np.array(lengths)
+        index._postings = dict(self._postings)
+        for gram in set(removed) | set(added):
+            rows = index._postings.get(gram, np.zeros(0, dtype=np.int32))
+            rows = rows[~np.isin(rows, removed.get(gram, []))]
+            rows = np.concatenate([rows, np.array(added.get(gram, []),
+                                                  dtype=np.int32)])
+            if len(rows):
+                index._postings[gram] = rows
+            else:
+                index._postings.pop(gram, None)
+        return index
+
+    def candidates(self, query, threshold=95):
+        """
+        Returns the positions of the names that may score at least the
+        threshold against the query, in increasing order.
+
+        Input:
+         query: string, name being searched
+         threshold: int, minimum score (from 0 to 100)
+
+        Output:
+         rows: numpy array of ints, positions in self.names
+        """
+        if threshold <= _PRUNING_THRESHOLD:
+            return np.arange(len(self.names))
+        processed = self._process(query, force_ascii=True)
+        postings = [self._postings[gram] for gram in _trigrams(processed)
+                    if gram in self._postings]
+        if not processed or not postings:
+            return np.zeros(0, dtype=np.int32)
+        rows = np.unique(np.concatenate(postings))
+        lengths = self._lengths[rows]
+        similar = (lengths < 1.5 * len(processed)) & \
+            (len(processed) < 1.5 * lengths)
+        return rows[similar]
+
+    def extract(self, query, limit=5, threshold=95):
+        """
+        Finds the names most similar to the query.
+
+        Input:
+         query: string, name being searched
+         limit: int, maximum number of names returned
+         threshold: int, minimum score (from 0 to 100) of names returned
+
+        Output:
+         res: list of tuples (name, score) sorted by decreasing score,
+              names with the same score are kept in their original order
+        """
+        scored = ((self.names[i], self._score(query, self.names[i]))
+                  for i in self.candidates(query, threshold))
+        return heapq.nlargest(limit, (match for match in scored
+                                      if match[1] >= threshold),
+                              key=lambda match: match[1])
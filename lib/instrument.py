@@ -0,0 +1,122 @@
+# instrument.py
+# call counters and latency histograms for the methods of Stocks
+import bisect
+import functools
+import time
+
+# Upper bounds (seconds) of the latency histogram buckets: 4 buckets per
+# decade from 100 nanoseconds to 10 seconds, plus one for slower calls
+BUCKETS = [10 ** (exponent / 4) for exponent in range(-28, 5)]
+
+
+class Instrumentation:
+    """
+    Records, for each instrumented method or load stage:
+    - calls: number of calls
+    - errors: number of calls that raised, per exception type
+    - outcomes: number of calls per outcome (e.g.: how generalizeCompany
+                found the company: by 'ticker', by 'name' or 'miss')
+    - latency: total, minimum and maximum seconds, and a histogram with the
+               number of calls per bucket (see BUCKETS)
+    An optional hook is called after each event with the arguments
+    (name, seconds, outcome, error), where seconds is None for outcomes
+    and outcome or error are None when not applicable.
+    """
+
+    def __init__(self, hook=None):
+        self.hook = hook
+        self._entries = dict()
+
+    def __entry__(self, name):
+        try:
+            return self._entries[name]
+        except KeyError:
+            self._entries[name] = entry = dict(
+                calls=0, errors=dict(), outcomes=dict(), total=0.0,
+                minimum=float('inf'), maximum=0.0,
+                histogram=[0] * (len(BUCKETS) + 1))
+            return entry
+
+    def record(self, name, seconds, error=None):
+        """
+        Records a call that took a number of seconds, and the exception it
+        raised (if any).
+        """
+        entry = self.__entry__(name)
+        entry['calls'] += 1
+        entry['total'] += seconds
+        entry['minimum'] = min(entry['minimum'], seconds)
+        entry['maximum'] = max(entry['maximum'], seconds)
+        entry['histogram'][bisect.bisect_left(BUCKETS, seconds)] += 1
+        if error is not None:
+            errors = entry['errors']
+            kind = type(error).__name__
+            errors[kind] = errors.get(kind, 0) + 1
+        if self.hook is not None:
+            self.hook(name, seconds, None, error)
+
+    def count(self, name, outcome):
+        """
+        Records the outcome of a call (e.g.: 'hit' or 'miss').
+        """
+        outcomes = self.__entry__(name)['outcomes']
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        if self.hook is not None:
+            self.hook(name, None, outcome, None)
+
+    def wrap(self, name, method):
+        """
+        Returns the method wrapped so that each call is recorded.
+        """
+        @functools.wraps(method)
+        def instrumented(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = method(*args, **kwargs)
+            except Exception as error:
+                self.record(name, time.perf_counter() - start, error)
+                raise
+            self.record(name, time.perf_counter() - start)
+            return result
+        return instrumented
+
+    def stats(self):
+        """
+        Returns a snapshot of everything recorded so far.
+
+        Output:
+         res: dictionary, maps each name to a dictionary with calls,
+              errors, outcomes, total, mean, minimum and maximum seconds,
+              approximate median (p50) and 99th percentile (p99) seconds,
+              and the histogram as a list of (upper bound, calls)
+        """
+        res = dict()
+        for name, entry in self._entries.items():
+            calls = entry['calls']
+            res[name] = dict(
+                calls=calls,
+                errors=dict(entry['errors']),
+                outcomes=dict(entry['outcomes']),
+                total=entry['total'],
+                mean=entry['total'] / calls if calls else 0.0,
+                minimum=entry['minimum'] if calls else 0.0,
+                maximum=entry['maximum'],
+                p50=_percentile(entry['histogram'], calls, 0.50),
+                p99=_percentile(entry['histogram'], calls, 0.99),
+                histogram=[(bound, n) for bound, n in zip(
+                    BUCKETS + [float('inf')], entry['histogram']) if n])
+        return res
+
+
+def _percentile(histogram, calls, fraction):
+    """
+    Returns the upper bound of the histogram bucket holding a percentile.
+    """
+    if calls == 0:
+        return 0.0
+    seen = 0
+    for bound, n in zip(BUCKETS + [float('inf')], histogram):
+        seen += n
+        if seen >= fraction * calls:
+            return bound
+    return float('inf')
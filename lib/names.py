@@ -0,0 +1,76 @@
+# names.py
+# normalization of company names, so that the variants of a name (case,
+# punctuation, ampersands, suffixes such as Inc or Holdings) share one key
+import re
+
+# Words dropped from the end of names (e.g.: 'Apple Inc.' -> 'apple')
+SUFFIXES = ('inc', 'incorporated', 'corp', 'corporation', 'co', 'cos',
+            'company', 'companies', 'holding', 'holdings', 'group', 'ltd',
+            'limited', 'plc', 'llc', 'lp', 'sa', 'ag', 'nv', 'trust')
+
+# Words dropped from the start of names (e.g.: 'The Home Depot' -> 'home depot')
+ARTICLES = ('the',)
+
+# Characters deleted ("McDonald's" -> 'mcdonalds', 'L.P.' -> 'lp')
+_DELETED = re.compile(r"[.'`’]")
+# Characters separating words ('Coca-Cola' -> 'coca cola')
+_SEPARATORS = re.compile(r'[^\w\s]+')
+
+
+class NameNormalizer:
+    """
+    Maps company names to a normalized key, so that names differing only in
+    case, punctuation, ampersands or suffixes have the same key. Each rule
+    can be turned off.
+
+    Example:
+     normalize = NameNormalizer()
+     normalize('JPMorgan Chase & Co.')  # 'jpmorgan chase'
+     normalize('jpmorgan chase and co')  # 'jpmorgan chase'
+     normalize('The Walt Disney Company')  # 'walt disney'
+    """
+
+    def __init__(self, case=True, punctuation=True, ampersand=True,
+                 suffixes=SUFFIXES, articles=ARTICLES):
+        """
+        Input:
+         case: bool, ignore case
+         punctuation: bool, delete dots and apostrophes and replace other
+                      punctuation by spaces
+         ampersand: bool, replace '&' by 'and'
+         suffixes: list of strings, words dropped from the end of names
+                   (a trailing 'and' is dropped with them, as in '& Co')
+         articles: list of strings, words dropped from the start of names
+        """
+        self.case = case
+        self.punctuation = punctuation
+        self.ampersand = ampersand
+        self.suffixes = frozenset(suffix.casefold() for suffix in suffixes)
+        self.articles = frozenset(article.casefold() for article in articles)
+
+    def __call__(self, name):
+        """
+        Returns the normalized key of a name.
+        """
+        if self.case:
+            name = name.casefold()
+        if self.ampersand:
+            name = name.replace('&', ' and ')
+        if self.punctuation:
+            name = _SEPARATORS.sub(' ', _DELETED.sub('', name))
+        words = name.split()
+        # keep at least one word, so that 'Group Inc' is not left empty
+        if len(words) > 1 and words[0].casefold() in self.articles:
+            del words[0]
+        while len(words) > 1 and words[-1].casefold() in self.suffixes:
+            del words[-1]
+            if len(words) > 1 and words[-1].casefold() == 'and':
+                del words[-1]
+        return ' '.join(words)
+
+    def __repr__(self):
+        return (f'NameNormalizer(case={self.case}, '
+                f'punctuation={self.punctuation}, '
+                f'ampersand={self.ampersand}, '
+                f'suffixes={sorted(self.suffixes)}, '
+                f'articles={sorted(self.articles)})')
@@ -0,0 +1,130 @@
+# parallel.py
+# generalizes large corpora with a pool of worker processes
+import collections
+import gc
+import itertools
+import multiprocessing
+import os
+import tempfile
+import time
+from . import parser
+
+# Lexicon used by the worker processes. With the fork start method the
+# workers inherit it from the parent process (pages are shared copy-on-write)
+# instead of loading the data again.
+_STOCKS = None
+_GENERALIZE = None
+
+
+def _initForked(year):
+    """
+    Initializes a forked worker process, which already has the lexicon.
+    """
+    global _GENERALIZE
+    _GENERALIZE = _STOCKS.__generalizer__(year)
+
+
+def _initSpawned(filename, path, columnar, year):
+    """
+    Initializes a spawned worker process, which loads the lexicon from a
+    snapshot file (see Stocks.fromSnapshot).
+    """
+    global _STOCKS, _GENERALIZE
+    from ..stocks import Stocks
+    _STOCKS = Stocks.fromSnapshot(filename, columnar, path)
+    _GENERALIZE = _STOCKS.__generalizer__(year)
+
+
+def _generalizeChunk(chunk):
+    """
+    Generalizes a chunk of lines in a worker process.
+    """
+    return [_GENERALIZE(line) for line in chunk]
+
+
+def _chunks(source, chunksize, encoding):
+    """
+    Splits the lines of a corpus into lists of chunksize lines.
+    """
+    lines = parser.readCorpus(source, encoding)
+    while True:
+        chunk = list(itertools.islice(lines, chunksize))
+        if not chunk:
+            return
+        yield chunk
+
+
+def generalizeCorpus(stocks, source, year='2018', processes=None,
+                     chunksize=1000, stats=None, encoding='utf-8'):
+    """
+    Generalizes a corpus with a pool of worker processes
+    (see Stocks.generalizeParallel).
+
+    Input:
+     stocks: instance of Stocks
+     source: iterable of strings or path to a text file
+     year: string, year from which to recover the market cap category
+     processes: int, number of worker processes (default: number of cpus)
+     chunksize: int, number of lines sent to a worker at a time
+     stats: dictionary or None, filled with throughput statistics
+     encoding: string, encoding of the text file
+
+    Output:
+     result: generator of strings, generalized lines in the input order
+    """
+    global _STOCKS
+    processes = processes or os.cpu_count() or 1
+    stats = dict() if stats is None else stats
+    stats.update(processes=processes, chunks=0, lines=0, characters=0,
+                 seconds=0.0, lines_per_second=0.0)
+    start = time.perf_counter()
+    snapshotFile = None
+    if 'fork' in multiprocessing.get_all_start_methods():
+        # build what the workers need before forking so that they share it,
+        # and keep the garbage collector from touching the shared pages
+        stocks.nameAutomaton    # built on first access
+        stocks.sizeCodes
+        stocks._industryNames
+        _STOCKS = stocks
+        gc.freeze()
+        pool = multiprocessing.get_context('fork').Pool(
+            processes, _initForked, (str(year),))
+        gc.unfreeze()
+    else:
+        with tempfile.NamedTemporaryFile(suffix='.npz', delete=False) as f:
+            snapshotFile = f.name
+        stocks.saveSnapshot(snapshotFile)
+        pool = multiprocessing.get_context('spawn').Pool(
+            processes, _initSpawned,
+            (snapshotFile, stocks.data_path, stocks.columnar, str(year)))
+    try:
+        # keep a bounded number of chunks in flight, so that memory does not
+        # grow with the size of the corpus, and collect them in order
+        pending = collections.deque()
+        window = 2 * processes
+        for chunk in _chunks(source, chunksize, encoding):
+            pending.append(pool.apply_async(_generalizeChunk, (chunk,)))
+            while len(pending) > window or \
+                    (pending and pending[0].ready()):
+                yield from _collect(pending.popleft().get(), stats, start)
+        while pending:
+            yield from _collect(pending.popleft().get(), stats, start)
+    finally:
+        pool.terminate()
+        pool.join()
+        _STOCKS = None
+        if snapshotFile is not None:
+            os.unlink(snapshotFile)
+
+
+def _collect(lines, stats, start):
+    """
+    Updates the throughput statistics with a generalized chunk and
+    returns it.
+    """
+    stats['chunks'] += 1
+    stats['lines'] += len(lines)
+    stats['characters'] += sum(len(line) for line in lines)
+    stats['seconds'] = time.perf_counter() - start
+    stats['lines_per_second'] = stats['lines'] / max(stats['seconds'], 1e-9)
+    return lines
@@ -1,7 +1,124 @@
 # parser.py
 # loads and parses marketcap.csv
+import csv as csvmodule
+import gzip
+import io
+import itertools
+import os
 import numpy as np
 
+# rows converted to numbers at a time, bounds the memory used by the strings
+_CHUNK = 65536
+
+
+def dataFile(path, filename):
+    """
+    Returns the path to a data file, which may also be stored gzip
+    compressed (e.g.: marketcap.csv.gz instead of marketcap.csv).
+
+    Input:
+     path: string, path to folder containing the data file
+     filename: string, name of the uncompressed file (e.g.: marketcap.csv)
+    """
+    plain = f'{path}{filename}'
+    if not os.path.isfile(plain) and os.path.isfile(f'{plain}.gz'):
+        return f'{plain}.gz'
+    return plain
+
+
+def _openData(path, filename):
+    """
+    Opens a data file for reading text (see parser.dataFile).
+    """
+    name = dataFile(path, filename)
+    opener = gzip.open if name.endswith('.gz') else open
+    # utf-8-sig drops the byte order mark some files start with
+    return opener(name, 'rt', encoding='utf-8-sig', newline='')
+
+
+def readCsv(path, filename):
+    """
+    Reads a csv data file once, from top to bottom. Quoted values are
+    parsed properly, so values may contain commas (e.g.: "AutoWeb, Inc.").
+    Reads the gzip compressed file if only that one exists
+    (see parser.dataFile).
+
+    Input:
+     path: string, path to folder containing the data file
+     filename: string, name of the csv file (e.g.: marketcap.csv)
+
+    Output:
+     header: list of strings, first row of the file
+     rows: iterator over the remaining rows (lists of strings),
+           empty lines are skipped
+    """
+    with _openData(path, filename) as csv:
+        reader = csvmodule.reader(csv)
+        yield next(reader, [])
+        for row in reader:
+            if row:
+                yield row
+
+
+def _parseNumbers(rows, width):
+    """
+    Converts rows of numbers (lists of strings, empty when not available)
+    to a matrix of integers in bulk, not available values are stored as 0.
+    Rows with fewer than width values are completed with 0s, rows with
+    more raise a ValueError rather than shifting values to other rows.
+    Full rows are parsed by numpy from a single string, the others by
+    parser._toNumbers, as are all rows when numpy cannot parse some value.
+    """
+    numbers = np.zeros((len(rows), width), dtype=np.int64)
+    lengths = np.array([len(row) for row in rows], dtype=np.int64)
+    if (lengths > width).any():
+        row = int(np.argmax(lengths > width))
+        raise ValueError(f'Expected {width} values, found {lengths[row]} '
+                         f'in row {row + 1}: {rows[row]}')
+    full = np.flatnonzero(lengths == width).tolist()
+    short = np.flatnonzero(lengths < width).tolist()
+    if full:
+        numbers[full] = _parseText([rows[i] for i in full], width)
+    if short:
+        numbers[short] = _toNumbers([rows[i] + [''] * (width - len(rows[i]))
+                                     for i in short])
+    return numbers
+
+
+def _parseText(rows, width):
+    """
+    Converts rows of width numbers to a matrix of integers
+    (see parser._parseNumbers) with numpy.loadtxt, falling back to
+    parser._toNumbers when numpy cannot parse some value.
+    """
+    # each line starts with a 0 column, so that no line is blank (loadtxt
+    # skips them) and no empty value starts a line
+    text = '0,' + '\n0,'.join(map(','.join, rows)) + '\n'
+    # fill the empty values, twice since consecutive ones share a comma
+    text = text.replace(',,', ',0,').replace(',,', ',0,')
+    text = text.replace(',\n', ',0\n')
+    try:
+        numbers = np.loadtxt(io.StringIO(text), delimiter=',',
+                             dtype=np.float64, ndmin=2)
+    except ValueError:
+        return _toNumbers(rows)
+    if numbers.shape != (len(rows), width + 1):   # values with commas
+        return _toNumbers(rows)
+    return numbers[:, 1:].astype(np.int64)
+
+
+def _toNumbers(values, missing=0):
+    """
+    Converts a list of rows of strings (empty when not available) to a
+    matrix of integers in bulk, not available values are stored as missing.
+    """
+    width = max((len(row) for row in values), default=0)
+    cells = np.array([row if len(row) == width else
+                      row + [''] * (width - len(row)) for row in values],
+                     dtype=str).reshape(len(values), width)
+    cells = np.where(cells == '', str(missing), cells)
+    return cells.astype(np.float64).astype(np.int64)
+
 
 def loadMarketcapYears(path='data/'):
     """
@@ -17,20 +134,68 @@ def loadMarketcapYears(path='data/'):
                 company in dollars
      years: list of years
     """
-    with open(f'{path}marketcap-years.csv', 'r') as csv:
-        header = csv.readline().strip().split(',')
-        assert len(header) >= 13, \
-            "Expected at least 13 columns (ticker, 2007, 2008, ...)"
-        data = csv.readlines()  # file is not big, about 4481 lines
-    total = len(data)
-    ticker = np.zeros(total, dtype='<U15')  # ticker < 15 chars
-    marketcap = np.zeros((total, len(header) - 1), dtype='int')
-    for i, line in zip(np.arange(total), data):
-        split = line.replace('"', '').strip().split(',')
-        ticker[i] = split[0]
-        marketcap[i, :] = [float(val) if val != '' else 0 for val in split[1:]]
+    rows = readCsv(path, 'marketcap-years.csv')
+    header = next(rows)
+    assert len(header) >= 13, \
+        "Expected at least 13 columns (ticker, 2007, 2008, ...)"
+    ticker = []
+    marketcap = [np.zeros((0, len(header) - 1), dtype='int')]
+    while True:
+        chunk = list(itertools.islice(rows, _CHUNK))
+        if not chunk:
+            break
+        ticker.extend(row[0].strip() for row in chunk)
         # if marketcap not available store a 0
-    return (ticker, marketcap, header[1:])
+        marketcap.append(_parseNumbers([row[1:] for row in chunk],
+                                       len(header) - 1))
+    ticker = np.array(ticker, dtype='<U15')  # ticker < 15 chars
+    return (ticker, np.concatenate(marketcap), header[1:])
+
+
+def loadMarketcapDaily(path='data/'):
+    """
+    Loads the daily market caps stored in the marketcap-daily.csv file,
+    one row per ticker and date (columns ticker, date as YYYY-MM-DD and
+    marketcap). Tickers are stored once and referenced by code, so that
+    millions of rows take 16 bytes each.
+
+    Input:
+     path: string, path to folder containing the marketcap-daily.csv file
+
+    Output:
+     tickers: numpy array of strings, ticker symbols
+     code: numpy array of int32, index in tickers of the ticker of each row
+     day: numpy array of int32, date of each row (days since 1970-01-01)
+     marketcap: numpy array of int64, market cap in dollars of each row
+                (0 if not available)
+    """
+    rows = readCsv(path, 'marketcap-daily.csv')
+    header = next(rows)
+    assert [column.strip().lower() for column in header] == \
+        ['ticker', 'date', 'marketcap'], \
+        "Expected the columns ticker, date and marketcap"
+    tickerToCode = dict()
+    code, day, marketcap = [], [], []
+    while True:
+        chunk = list(itertools.islice(rows, _CHUNK))
+        if not chunk:
+            break
+        code.append(np.array([
+            tickerToCode.setdefault(row[0].strip(), len(tickerToCode))
+            for row in chunk], dtype=np.int32))
+        # dates and market caps are converted in bulk
+        date = np.array([row[1].strip() if len(row) > 1 else ''
+                         for row in chunk], dtype='datetime64[D]')
+        if np.isnat(date).any():
+            row = chunk[int(np.argmax(np.isnat(date)))]
+            raise ValueError(f'Expected a date in row {row}')
+        day.append(date.astype(np.int32))
+        marketcap.append(_parseNumbers([row[2:] for row in chunk], 1)
+                         .reshape(len(chunk)))
+    return (np.array(list(tickerToCode), dtype='<U15'),
+            np.concatenate(code or [np.zeros(0, np.int32)]),
+            np.concatenate(day or [np.zeros(0, np.int32)]),
+            np.concatenate(marketcap or [np.zeros(0, np.int64)]))
 
 
 def loadMarketcapNames(path='data/'):
@@ -48,24 +213,14 @@ def loadMarketcapNames(path='data/'):
      name: numpy array of strings, company name (e.g.: Apple Inc)
      ticker: numpy array of strings, company ticker symbol (e.g.: AAPL)
     """
-    with open(f'{path}marketcap.csv', 'r') as csv:
-        header = csv.readline().split(',')
-        assert len(header) >= 3, \
-            "Expected at least 3 columns (marketcap, name, ticker)"
-        data = csv.readlines()  # file is not big, about 4481 lines
-    total = len(data)
-    marketcap = np.zeros(total, dtype='int')  # no need to keep cents
-    name = np.zeros(total, dtype='<U500')  # name < 500 chars
-    ticker = np.zeros(total, dtype='<U15')  # ticker < 15 chars
-    for i, line in zip(np.arange(total), data):
-        # splitting on comma only does not work even though the file is
-        # supposedly csv, since some names have "AutoWeb, Inc", "AUTO"
-        # the comma in the middle of the name breaks things
-        split = line.replace('"', '').strip().split(',')
-        marketcap[i] = int(float(split[0]))
-        # sometimes there are commas in the name, generating additional splits
-        name[i] = ' '.join(split[1:-1]).strip()
-        ticker[i] = split[-1].strip()   # ticker is always the last
+    rows = readCsv(path, 'marketcap.csv')
+    header = next(rows)
+    assert len(header) >= 3, \
+        "Expected at least 3 columns (marketcap, name, ticker)"
+    rows = list(rows)
+    marketcap = _toNumbers([row[:1] for row in rows]).reshape(len(rows))
+    name = np.array([row[1].strip() for row in rows], dtype=str)
+    ticker = np.array([row[2].strip() for row in rows], dtype='<U15')
     return (marketcap, name, ticker)
 
 
@@ -105,13 +260,9 @@ def loadIndustryCategories(path='data/'):
      res: dictionary, maps ticker symbols (string) to
           industry category (string)
     """
-    res = dict()
-    with open(f'{path}industries.csv', 'r') as csv:
-        csv.readline()          # skip header
-        for line in csv:
-            split = line.strip().replace('"', '').split(',')
-            res[split[1]] = split[0]
-    return res
+    rows = readCsv(path, 'industries.csv')
+    next(rows)                  # skip header
+    return {row[1]: row[0] for row in rows}
 
 
 def loadCompanyNames(path='data/'):
@@ -127,14 +278,85 @@ def loadCompanyNames(path='data/'):
      res: dictionary, maps ticker symbol (string) to
           company name (string)
     """
-    res = dict()
-    with open(f'{path}marketcap.csv', 'r') as csv:
-        csv.readline()          # skip header
-        for line in csv:
-            # splitting lines by comma does not perfectly work
-            # this is because some names have commas: "AutoWeb, Inc", "AUTO"
-            split = line.replace('"', '').strip().split(',')
-            ticker = split[-1].strip()   # ticker is always the last
-            name = ' '.join(split[1:-1]).strip()
-            res[ticker] = name
-    return res
+    rows = readCsv(path, 'marketcap.csv')
+    next(rows)                  # skip header
+    return {row[2].strip(): row[1].strip() for row in rows}
+
+
+def loadAliases(path='data/'):
+    """
+    Creates a dictionary that maps other names companies are known by to
+    their ticker symbol (e.g.: Google -> GOOG), from aliases.csv
+    (columns alias and ticker).
+
+    Input:
+     path: string, complete path to folder containing aliases.csv
+
+    Output:
+     res: dictionary, maps names (string) to ticker symbols (string),
+          empty if there is no aliases.csv
+    """
+    if not os.path.isfile(dataFile(path, 'aliases.csv')):
+        return dict()
+    rows = readCsv(path, 'aliases.csv')
+    next(rows)                  # skip header
+    return {row[0].strip(): row[1].strip() for row in rows}
+
+
+def loadUpdate(filename):
+    """
+    Loads a file with changes to the data of companies
+    (see Stocks.applyUpdate). The file is a csv with a ticker column and
+    optionally a name column (legal name), an industry column (industry
+    category) and one column per year (market cap in dollars), in any
+    order. Empty cells mean no change.
+
+    Input:
+     filename: string, path to the csv file (or to its .gz compressed
+               version, see parser.dataFile)
+
+    Output:
+     ticker: numpy array of strings, ticker symbol of each row
+     name: list of strings or None (without name column), legal names
+     industry: list of strings or None (without industry column),
+               industry categories
+     marketcap: numpy array of ints, one row per ticker and one column per
+                year, -1 where the market cap does not change
+     years: list of strings, years of the marketcap columns
+    """
+    rows = readCsv('', filename)
+    header = [column.strip().lower() for column in next(rows)]
+    assert 'ticker' in header, "Expected a ticker column"
+    years = [column for column in header if column.isdigit()]
+    unknown = set(header) - {'ticker', 'name', 'industry', *years}
+    assert not unknown, f"Unexpected columns {sorted(unknown)}"
+    rows = list(rows)
+    columns = {column: [row[i].strip() if i < len(row) else ''
+                        for row in rows] for i, column in enumerate(header)}
+    ticker = np.array(columns['ticker'], dtype='<U15')
+    marketcap = _toNumbers([list(values) for values in
+                            zip(*(columns[year] for year in years))],
+                           missing=-1)
+    return (ticker, columns.get('name'), columns.get('industry'),
+            marketcap.reshape(len(rows), len(years)), years)
+
+
+def readCorpus(source, encoding='utf-8'):
+    """
+    Iterates over the lines or documents of a corpus.
+
+    Input:
+     source: iterable of strings (lines or documents), or path to a
+             text file which is read line by line (gzip compressed if
+             the file name ends in .gz)
+     encoding: string, encoding of the text file
+
+    Output:
+     result: generator of strings, lines or documents of the corpus
+    """
+    if isinstance(source, (str, os.PathLike)):
+        opener = gzip.open if str(source).endswith('.gz') else open
+        with opener(source, 'rt', encoding=encoding) as corpus:
+            yield from corpus
+    else:
+        yield from source
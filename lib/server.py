@@ -0,0 +1,439 @@
+# server.py
+# local lookup server sharing one Stocks instance over HTTP (TCP or Unix
+# socket), with concurrent lookups coalesced into batches
+#
+# Usage (from the folder containing stockslexicon):
+#  python -m stockslexicon.lib.server --port 8765
+#  python -m stockslexicon.lib.server --unix /tmp/stockslexicon.sock
+#
+# Endpoints (parameters in the query string of a GET or in the json body of
+# a POST, responses in json):
+#  /generalizeCompany  company, year        {"result": "MEGA_INTERNET"}
+#  /generalizeTicker   ticker, year         {"size", "industry", "found"}
+#  /matchName          name, limit, threshold
+#                                           {"matches": [{"name", "score",
+#                                                         "ticker"}, ...]}
+#  /generalizeString   text, year           {"result": "..."}
+#  /findNames          text                 {"matches": [{"start", "stop",
+#                                                         "ticker"}, ...]}
+#  /complete           prefix, k            {"matches": [{"ticker", "name"},
+#                                                        ...]}
+#  /batch              companies, tickers or names (lists of strings),
+#                      years (one for all or a list of the same length)
+#                                           {"result": [...]} for companies,
+#                                           {"size", "industry", "found"}
+#                                           lists otherwise
+#  /health, /stats
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import os
+import sys
+import time
+import urllib.parse
+from ..stocks import Stocks, _DATA_FOLDER
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+            405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+
+class Batcher:
+    """
+    Coalesces concurrent single lookups into one call of a batch method
+    (e.g.: Stocks.generalizeCompanies). When no batch is being resolved,
+    lookups are sent right away together with the ones already received,
+    so that a lone lookup does not wait. Otherwise the first lookup of a
+    batch waits at most window seconds for others to join it. Either way a
+    batch is sent as soon as it holds maxSize lookups.
+    """
+
+    def __init__(self, function, run, window=0.001, maxSize=1024):
+        """
+        Input:
+         function: function(keys, years), returns a list with the result
+                   of each key
+         run: coroutine function, run(function, *args) calls the function
+              away from the event loop (see LookupServer.__run__)
+         window: float, seconds a lookup waits for others
+         maxSize: int, maximum number of lookups per batch
+        """
+        self.function = function
+        self.run = run
+        self.window = window
+        self.maxSize = maxSize
+        self.batches = 0
+        self.items = 0
+        self._pending = []
+        self._timer = None
+        self._tasks = set()     # batches being resolved
+
+    async def submit(self, key, year):
+        """
+        Looks up a key, batched with the other lookups submitted meanwhile.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((key, year, future))
+        if len(self._pending) >= self.maxSize:
+            self.__flush__()
+        elif self._timer is None:
+            delay = self.window if self._tasks else 0
+            self._timer = loop.call_later(delay, self.__flush__)
+        return await future
+
+    def __flush__(self):
+        """
+        Sends the pending lookups as a batch.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self.__resolve__(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def __resolve__(self, batch):
+        """
+        Calls the batch method and hands each lookup its result.
+        """
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = await self.run(self.function,
+                                     [key for key, _, _ in batch],
+                                     [year for _, year, _ in batch])
+        except Exception as error:
+            results = [error] * len(batch)
+        for (_, _, future), result in zip(batch, results):
+            if future.done():
+                continue        # the client went away
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self):
+        return dict(batches=self.batches, items=self.items,
+                    mean_size=self.items / self.batches if self.batches else 0)
+
+
+def _year(params):
+    """
+    Returns the year parameter of a request (2018 by default).
+    """
+    return str(int(params.get('year', 2018)))
+
+
+def _strings(params, key):
+    """
+    Returns a parameter of a request that must be a json list of strings,
+    raises TypeError otherwise (a single string is not taken as a list of
+    characters).
+    """
+    values = params[key]
+    if not isinstance(values, list) or \
+            not all(isinstance(value, str) for value in values):
+        raise TypeError(f'{key} must be a list of strings')
+    return values
+
+
+def _years(params, count):
+    """
+    Returns the years parameter of a batch of count lookups: a single year
+    for all of them (2018 by default) or a list with one year per lookup.
+    """
+    years = params.get('years', 2018)
+    if not isinstance(years, list):
+        return str(int(years))
+    if len(years) != count:
+        raise ValueError(f'years has {len(years)} values, expected {count}')
+    return [str(int(year)) for year in years]
+
+
+class LookupServer:
+    """
+    Serves the lookups of a Stocks instance over HTTP, so that several
+    services share a single copy of the data instead of loading their own.
+    The instance is only used from one worker thread, which runs the
+    lookups while the event loop keeps accepting requests. Concurrent
+    generalizeCompany and generalizeTicker requests are answered together
+    with the batch methods of Stocks (see Batcher).
+
+    Example:
+     server = LookupServer(Stocks())
+     asyncio.run(server.serve(port=8765))
+    """
+
+    def __init__(self, stocks, window=0.001, maxBatch=1024):
+        """
+        Input:
+         stocks: instance of Stocks
+         window: float, seconds a lookup waits for others to batch with
+         maxBatch: int, maximum number of lookups per batch
+        """
+        self.stocks = stocks
+        self.requests = 0
+        self.errors = 0
+        self.started = time.time()
+        self._executor = concurrent.futures.ThreadPoolExecutor(1)
+        self.companies = Batcher(self.__generalize_companies__, self.__run__,
+                                 window, maxBatch)
+        self.tickers = Batcher(self.__generalize_tickers__, self.__run__,
+                               window, maxBatch)
+        self._routes = {
+            '/generalizeCompany': self.__generalize_company__,
+            '/generalizeTicker': self.__generalize_ticker__,
+            '/matchName': self.__match_name__,
+            '/generalizeString': self.__generalize_string__,
+            '/findNames': self.__find_names__,
+            '/complete': self.__complete__,
+            '/batch': self.__batch__,
+            '/health': self.__health__,
+            '/stats': self.__stats__,
+        }
+
+    def warmUp(self):
+        """
+        Builds the helper structures used by the lookups before serving,
+        so that the first requests do not wait for them.
+        """
+        for name in ('nameToTicker', 'nameKeys', 'nameAutomaton',
+                     '_sortedTickers', 'sizeCodes', '_industryNames',
+                     'completions'):
+            getattr(self.stocks, name)
+        try:
+            self.stocks.nameIndex
+        except ImportError:
+            pass                # fuzzywuzzy not installed, no fuzzy search
+
+    async def serve(self, host='127.0.0.1', port=8765, unix=None):
+        """
+        Serves requests until cancelled, on a TCP port or on a Unix socket.
+
+        Input:
+         host: string, address to listen on
+         port: int, TCP port to listen on
+         unix: string or None, path of a Unix socket to listen on instead
+        """
+        if unix is not None:
+            if os.path.exists(unix):
+                os.unlink(unix)         # left over by a previous server
+            server = await asyncio.start_unix_server(self.__connection__,
+                                                     unix)
+        else:
+            server = await asyncio.start_server(self.__connection__, host,
+                                                port)
+        address = unix or '{}:{}'.format(*server.sockets[0].getsockname())
+        print(f'Serving on {address}', file=sys.stderr, flush=True)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self._executor.shutdown(wait=False)
+            if unix is not None and os.path.exists(unix):
+                os.unlink(unix)
+
+    async def __run__(self, function, *args):
+        """
+        Calls function(*args) in the worker thread.
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, function, *args)
+
+    async def __connection__(self, reader, writer):
+        """
+        Answers the requests of a connection (kept alive between requests
+        unless the client asks to close it).
+        """
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                headers = dict()
+                while True:
+                    header = await reader.readline()
+                    if header in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = header.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    method, target, version = line.decode('latin-1').split()
+                    body = await reader.readexactly(
+                        int(headers.get('content-length', 0)))
+                except ValueError:
+                    await self.__respond__(writer, 400, dict(
+                        error='Malformed request'), False)
+                    break
+                status, payload = await self.__handle__(method, target, body)
+                connection = headers.get('connection', '').lower()
+                keepAlive = connection == 'keep-alive' or \
+                    (version == 'HTTP/1.1' and connection != 'close')
+                await self.__respond__(writer, status, payload, keepAlive)
+                if not keepAlive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def __respond__(self, writer, status, payload, keepAlive):
+        """
+        Writes a json response.
+        """
+        body = json.dumps(payload).encode('utf-8')
+        head = [f'HTTP/1.1 {status} {_REASONS[status]}',
+                'Content-Type: application/json',
+                f'Content-Length: {len(body)}']
+        if not keepAlive:
+            head.append('Connection: close')
+        writer.write('\r\n'.join(head).encode('latin-1') + b'\r\n\r\n' + body)
+        await writer.drain()
+
+    async def __handle__(self, method, target, body):
+        """
+        Routes a request to its endpoint.
+
+        Output:
+         status: int, HTTP status code
+         payload: dictionary, json response
+        """
+        self.requests += 1
+        url = urllib.parse.urlsplit(target)
+        endpoint = self._routes.get(url.path)
+        if endpoint is None:
+            status, payload = 404, dict(error=f'Unknown path {url.path}')
+        elif method not in ('GET', 'POST'):
+            status, payload = 405, dict(error=f'Unsupported method {method}')
+        else:
+            try:
+                params = dict(urllib.parse.parse_qsl(url.query))
+                if body:
+                    params.update(json.loads(body))
+                status, payload = 200, await endpoint(params)
+            except (KeyError, ValueError, TypeError) as error:
+                # missing or invalid parameters, unknown years or industries
+                status, payload = 400, dict(
+                    error=f'{type(error).__name__}: {error}')
+            except Exception as error:
+                status, payload = 500, dict(
+                    error=f'{type(error).__name__}: {error}')
+        if status != 200:
+            self.errors += 1
+        return (status, payload)
+
+    def __generalize_companies__(self, companies, years):
+        return self.stocks.generalizeCompanies(companies, years).tolist()
+
+    def __generalize_tickers__(self, tickers, years):
+        return list(zip(*(array.tolist() for array in
+                          self.stocks.generalizeTickers(tickers, years))))
+
+    async def __generalize_company__(self, params):
+        result = await self.companies.submit(str(params['company']),
+                                             _year(params))
+        return dict(result=result or None)
+
+    async def __generalize_ticker__(self, params):
+        size, industry, found = await self.tickers.submit(
+            str(params['ticker']), _year(params))
+        return dict(size=size, industry=industry, found=found)
+
+    async def __match_name__(self, params):
+        matches = await self.__run__(
+            self.stocks.matchNameFuzzy, str(params['name']),
+            int(params.get('limit', 5)), int(params.get('threshold', 95)))
+        return dict(matches=[dict(name=name, score=score,
+                                  ticker=self.stocks.nameToTicker.get(name))
+                             for name, score in matches])
+
+    async def __generalize_string__(self, params):
+        result = await self.__run__(self.stocks.generalizeString,
+                                    str(params['text']), _year(params))
+        return dict(result=result)
+
+    async def __find_names__(self, params):
+        matches = await self.__run__(self.stocks.findNamesInString,
+                                     str(params['text']))
+        return dict(matches=[dict(start=match.start, stop=match.stop,
+                                  ticker=ticker)
+                             for match, ticker in matches])
+
+    async def __complete__(self, params):
+        matches = await self.__run__(self.stocks.complete,
+                                     str(params['prefix']),
+                                     int(params.get('k', 10)))
+        return dict(matches=[dict(ticker=ticker, name=name)
+                             for ticker, name in matches])
+
+    async def __batch__(self, params):
+        if 'companies' in params:
+            companies = _strings(params, 'companies')
+            result = await self.__run__(self.__generalize_companies__,
+                                        companies,
+                                        _years(params, len(companies)))
+            return dict(result=[label or None for label in result])
+        for key, method in (('tickers', self.stocks.generalizeTickers),
+                            ('names', self.stocks.generalizeNames)):
+            if key in params:
+                values = _strings(params, key)
+                size, industry, found = await self.__run__(
+                    method, values, _years(params, len(values)))
+                return dict(size=size.tolist(), industry=industry.tolist(),
+                            found=found.tolist())
+        raise KeyError('companies, tickers or names')
+
+    async def __health__(self, params):
+        return dict(tickers=self.stocks.total_tickers,
+                    years=[self.stocks.year_start, self.stocks.year_end])
+
+    async def __stats__(self, params):
+        return dict(requests=self.requests, errors=self.errors,
+                    uptime=time.time() - self.started,
+                    batches=dict(generalizeCompany=self.companies.stats(),
+                                 generalizeTicker=self.tickers.stats()),
+                    companyCache=self.stocks.companyCacheInfo(),
+                    instrumentation=self.stocks.stats())
+
+
+def main():
+    arguments = argparse.ArgumentParser(description=(
+        'Serves company lookups from a single Stocks instance over HTTP, '
+        'on a TCP port or on a Unix socket.'))
+    arguments.add_argument('--host', default='127.0.0.1',
+                           help='address to listen on')
+    arguments.add_argument('--port', type=int, default=8765,
+                           help='TCP port to listen on')
+    arguments.add_argument('--unix', default=None,
+                           help='path of a Unix socket to listen on instead')
+    arguments.add_argument('--path', default=_DATA_FOLDER,
+                           help='folder containing the csv data files')
+    arguments.add_argument('--snapshot', action='store_true',
+                           help='load the data from a snapshot '
+                                '(see Stocks.fromSnapshot)')
+    arguments.add_argument('--columnar', action='store_true',
+                           help='keep the data in arrays only')
+    arguments.add_argument('--window', type=float, default=1.0,
+                           help='milliseconds a lookup waits for others '
+                                'to batch with')
+    arguments.add_argument('--max-batch', type=int, default=1024,
+                           help='maximum number of lookups per batch')
+    options = arguments.parse_args()
+
+    if options.snapshot:
+        stocks = Stocks.fromSnapshot(None, options.columnar, options.path)
+    else:
+        stocks = Stocks(options.columnar, options.path)
+    server = LookupServer(stocks, options.window / 1000, options.max_batch)
+    server.warmUp()
+    try:
+        asyncio.run(server.serve(options.host, options.port, options.unix))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+# snapshot.py
+# saves and loads the parsed data as a single binary file (numpy .npz)
+import hashlib
+import json
+import os
+import tempfile
+import zipfile
+import numpy as np
+from .parser import dataFile
+
+# files the data is parsed from (or their .gz compressed version),
+# a snapshot is stale once any of them change
+SOURCES = ('marketcap.csv', 'industries.csv', 'marketcap-years.csv')
+
+
+def _hashFile(filename):
+    """
+    Returns the sha1 hex digest of the contents of a file.
+    """
+    sha1 = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+def fingerprint(path='data/', sources=SOURCES):
+    """
+    Describes the current state of the source data files.
+
+    Input:
+     path: string, path to folder containing the source csv files
+     sources: list of strings, names of the source files
+
+    Output:
+     res: dictionary, maps each source file name to a list with its
+          size (bytes), modification time (ns) and sha1 hash
+    """
+    res = dict()
+    for source in sources:
+        filename = dataFile(path, source)
+        stat = os.stat(filename)
+        res[source] = [stat.st_size, stat.st_mtime_ns, _hashFile(filename)]
+    return res
+
+
+def isFresh(stored, path='data/', sources=SOURCES):
+    """
+    Checks if the source data files are the same as when a snapshot was
+    saved. Files whose size changed are stale, files whose modification time
+    did not change are fresh, and the remaining files (touched or copied)
+    are compared by hash.
+
+    Input:
+     stored: dictionary, fingerprint saved with the snapshot
+     path: string, path to folder containing the source csv files
+     sources: list of strings, names of the source files
+
+    Output:
+     res: bool, True if the snapshot can be used
+    """
+    for source in sources:
+        filename = dataFile(path, source)
+        try:
+            size, mtime, sha1 = stored[source]
+            stat = os.stat(filename)
+        except (KeyError, ValueError, OSError):
+            return False
+        if stat.st_size != size:
+            return False
+        if stat.st_mtime_ns != mtime and _hashFile(filename) != sha1:
+            return False
+    return True
+
+
+def saveSnapshot(filename, arrays, path='data/'):
+    """
+    Saves arrays to a snapshot file along with the fingerprint of the
+    source data files. The file is replaced atomically, so processes
+    loading the snapshot never see a partially written file.
+
+    Input:
+     filename: string, snapshot file (e.g.: 'data/stocks-snapshot.npz')
+     arrays: dictionary, maps names (string) to numpy arrays
+     path: string, path to folder containing the source csv files
+    """
+    source = json.dumps(fingerprint(path))
+    folder = os.path.dirname(os.path.abspath(filename))
+    with tempfile.NamedTemporaryFile(dir=folder, suffix='.npz',
+                                     delete=False) as f:
+        try:
+            np.savez(f, fingerprint=np.array(source), **arrays)
+        except BaseException:
+            os.unlink(f.name)
+            raise
+    os.replace(f.name, filename)
+
+
+def loadSnapshot(filename, path='data/'):
+    """
+    Loads the arrays saved in a snapshot file, as long as the source data
+    files did not change since the snapshot was saved.
+
+    Input:
+     filename: string, snapshot file (e.g.: 'data/stocks-snapshot.npz')
+     path: string, path to folder containing the source csv files
+
+    Output:
+     arrays: dictionary or None, maps names (string) to numpy arrays,
+             None if the snapshot is missing, unreadable or stale
+    """
+    try:
+        with np.load(filename, allow_pickle=False) as snapshot:
+            if not isFresh(json.loads(str(snapshot['fingerprint'])), path):
+                return None
+            return {key: snapshot[key] for key in snapshot.files
+                    if key != 'fingerprint'}
+    except (OSError, ValueError, KeyError, EOFError, zipfile.BadZipFile):
+        return None
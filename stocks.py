@@ -1,64 +1,471 @@
 # stockslexicon.py
+import bisect
+import functools
+import hashlib
 import os
+import re
+import tempfile
+import threading
+import time
 import numpy as np
 from .lib import parser
-from fuzzywuzzy import process
+from .lib import parallel
+from .lib.instrument import Instrumentation
+from .lib import snapshot
+from .lib import daily
+from .lib import frames
+from .lib.automaton import NameAutomaton
+from .lib.autocomplete import PrefixIndex, normalizePrefix
+from .lib.columnar import ContentsView, StringPool, readField
+from .lib.fuzzy import NgramIndex
+from .lib.names import NameNormalizer
 
 # obtain path to data folder
 _DATA_FOLDER = f'{__file__[:-9]}/data/'
 
-# Check if original data is in place
-assert 'marketcap.csv' in os.listdir(_DATA_FOLDER), \
-    "Expected marketcap.csv in data/ folder"
+# snapshot of the parsed data, saved in the data folder
+_SNAPSHOT_FILE = 'stocks-snapshot.npz'
+
+# compressed daily market caps (see lib/daily.py), saved in the data folder
+# as .npy (chunks) and .npz (index)
+_DAILY_FILE = 'marketcap-daily'
+
+# words of a text, see Stocks.generalizeString
+_WORD = re.compile(r'\S+')
+
+# guards the creation of the instance shared by the whole process
+_SHARED_LOCK = threading.Lock()
+
+# serializes updates of the data (see Stocks.applyUpdate)
+_UPDATE_LOCK = threading.Lock()
+
+# serializes the builds of helper structures (see Stocks.__getattr__),
+# reentrant since structures are built from other structures
+_BUILD_LOCK = threading.RLock()
+
+# Market cap categories and the boundaries between them (in dollars)
+_MARKETCAP_BOUNDARY = np.array([50, 300, 2000, 10000, 200000])*1000000
+_MARKETCAP_CATEGORIES = np.array(['Nano', 'Micro', 'Small',
+                                  'Mid', 'Large', 'Mega'])
+# the same categories as python strings, indexed by size codes
+# (see Stocks.__build_size_codes__)
+_SIZES = _MARKETCAP_CATEGORIES.tolist()
+_BOUNDARIES = _MARKETCAP_BOUNDARY.tolist()
 
 
 class Stocks:
-    def __init__(self):
+    # Helper structures are built on first access (see Stocks.__getattr__),
+    # this maps each structure to the method that builds it
+    _LAZY = {
+        'contents': '__build_contents__',
+        'allNames': '__build_list_of_names__',
+        'nameToTicker': '__build_name_ticker_dict__',
+        'nameAutomaton': '__build_name_automaton__',
+        'nameIndex': '__build_name_index__',
+        '_tickerOrder': '__build_ticker_index__',
+        '_sortedTickers': '__build_ticker_index__',
+        '_marketcapOrder': '__build_marketcap_index__',
+        '_sortedMarketcaps': '__build_marketcap_index__',
+        '_industryOrder': '__build_marketcap_index__',
+        '_industryMarketcaps': '__build_marketcap_index__',
+        '_industryBounds': '__build_marketcap_index__',
+        '_aggregates': '__build_aggregates__',
+        'aliases': '__build_aliases__',
+        'nameKeys': '__build_name_keys__',
+        '_companyCache': '__build_company_cache__',
+        'sizeCodes': '__build_size_codes__',
+        '_industryNames': '__build_industry_names__',
+        'daily': '__build_daily__',
+        'completions': '__build_completions__',
+    }
+    _shared = None
+    # Public methods recorded when instrumentation is enabled
+    # (see Stocks.enableInstrumentation)
+    _INSTRUMENTED = (
+        'size', 'sizeFromName', 'tickerFromName', 'listAllNames',
+        'industry', 'industryFromName', 'generalizeTicker', 'generalizeName',
+        'generalizeTickers', 'generalizeNames', 'generalizeCompanies',
+        'generalizeNameFuzzy',
+        'matchNameFuzzy', 'findNameInString', 'findNamesInString',
+        'generalizeCompany', 'generalizeString', 'screen', 'topCompanies',
+        'screenPercentile', 'crossTab', 'sizeMigrations', 'applyUpdate',
+        'joinTickers', 'marketcapAsOf', 'sizeAsOf', 'generalizeTickerAsOf',
+        'marketcapRange', 'complete',
+    )
+    _instrumentation = None
+    # Rules matching variants of company names (see Stocks.setNameNormalizer)
+    nameNormalizer = NameNormalizer()
+    # Results of generalizeCompany remembered (see Stocks.setCompanyCacheSize)
+    companyCacheSize = 65536
+    # Frozen snapshots cannot be changed (see Stocks.freeze)
+    _frozen = False
+
+    def __init__(self, columnar=False, path=_DATA_FOLDER):
         """
         Populates the contents with market cap values per year and industry
         categories for all companies with data available in the
         file marketcap-years.csv.
+
+        Input:
+         columnar: bool, if True the data of the companies is kept only in
+                   arrays (see Stocks.__build_columns__) and self.contents
+                   is a read-only view over them, which takes a fraction of
+                   the memory. Otherwise self.contents is a dictionary
+                   holding one dictionary per company (default).
+         path: string, path to folder containing the csv data files
+               (the data/ folder of this repository by default)
         """
+        # Check if original data is in place
+        assert os.path.isfile(parser.dataFile(path, 'marketcap.csv')), \
+            f"Expected marketcap.csv in {path} folder"
+        self.data_path = path
+        self.buildTimes = dict()
 
         # Load all ticker symbols and names available in 2018
-        name = parser.loadCompanyNames(_DATA_FOLDER)
+        name = self.__timed__('loadCompanyNames',
+                              parser.loadCompanyNames, path)
 
         # Load map between ticker and industry category in 2018
-        industry = parser.loadIndustryCategories(_DATA_FOLDER)
+        industry = self.__timed__('loadIndustryCategories',
+                                  parser.loadIndustryCategories, path)
 
         # Load market cap data for the 2007-2018 period
-        (ticker, marketcap, year) = parser.loadMarketcapYears(_DATA_FOLDER)
+        (ticker, marketcap, year) = self.__timed__(
+            'loadMarketcapYears', parser.loadMarketcapYears, path)
 
-        # Create dictionary to map ticker to contents:
+        # Store the contents of each company in arrays, one row per ticker:
         # - Market cap per year
         # - Company legal name
         # - Company name optimized for search
         # - Company industry category
-        self.contents = dict.fromkeys(ticker)
-        for i in np.arange(len(ticker)):
-            legalName = name[ticker[i]]
-            clearName = str(parser.clearNames(legalName))
+        self.__timed__('build_columns', self.__build_columns__,
+                       ticker, marketcap, year, name, industry)
+        self.__build_lexicon__(columnar)
+
+    @classmethod
+    def shared(cls):
+        """
+        Returns an instance of the class shared by the whole process,
+        created on the first call. Use it to avoid loading the data more
+        than once when several modules need it.
+
+        Output:
+         stocks: instance of Stocks
+        """
+        if cls._shared is None:
+            with _SHARED_LOCK:
+                if cls._shared is None:
+                    cls._shared = cls()
+        return cls._shared
+
+    @classmethod
+    def fromSnapshot(cls, filename=None, columnar=False, path=_DATA_FOLDER):
+        """
+        Creates the class from a snapshot file saved by Stocks.saveSnapshot,
+        which is much faster than parsing the csv data files.
+        If the snapshot is missing, or the csv files changed since it was
+        saved, then the data is parsed from the csv files and the snapshot
+        is saved again.
+
+        Input:
+         filename: string, snapshot file
+                   (default: stocks-snapshot.npz in the data folder)
+         columnar: bool, see Stocks.__init__
+         path: string, path to folder containing the csv data files
+
+        Output:
+         stocks: instance of Stocks
+        """
+        if filename is None:
+            filename = f'{path}{_SNAPSHOT_FILE}'
+        arrays = snapshot.loadSnapshot(filename, path)
+        if arrays is None:
+            stocks = cls(columnar, path)
             try:
-                industryCategory = industry[ticker[i]]
-            except KeyError:
-                industryCategory = ''  # not available
-            self.contents[ticker[i]] = dict(
-                zip(year, marketcap[i, :]),
-                legal_name=legalName,
-                name=clearName,
-                industry=industryCategory
-            )
+                stocks.saveSnapshot(filename)
+            except OSError:
+                pass            # read-only folder, use the parsed data
+            return stocks
+        stocks = cls.__new__(cls)
+        stocks.data_path = path
+        stocks.buildTimes = dict()
+        stocks.__timed__('load_columns', stocks.__load_columns__, arrays)
+        stocks.__build_lexicon__(columnar)
+        return stocks
+
+    def saveSnapshot(self, filename=None):
+        """
+        Saves the data of all companies to a snapshot file, which can be
+        loaded with Stocks.fromSnapshot. The snapshot records the size,
+        modification time and hash of the csv data files so that it is
+        ignored once they change.
+
+        Input:
+         filename: string, snapshot file
+                   (default: stocks-snapshot.npz in the data folder)
+        """
+        if filename is None:
+            filename = f'{self.data_path}{_SNAPSHOT_FILE}'
+        snapshot.saveSnapshot(filename, dict(
+            tickers=self.tickers,
+            years=np.array(self.years),
+            marketcaps=self.marketcaps,
+            legalNames=np.frombuffer(self.legalNames.data, dtype=np.uint8),
+            legalNameOffsets=self.legalNames.offsets,
+            names=np.frombuffer(self.names.data, dtype=np.uint8),
+            nameOffsets=self.names.offsets,
+            industryLabels=self.industryLabels,
+            industryCodes=self.industryCodes
+        ), self.data_path)
+
+    def applyUpdate(self, filename):
+        """
+        Applies a file of changes to the data in place, without parsing the
+        data files again: adds companies and years, and changes the market
+        caps, names and industry categories of companies.
+        Only the companies in the file are processed. The helper structures
+        already built are updated (the name search automaton and the
+        screening indexes are rebuilt) and the cached results (crossTab,
+        sizeMigrations, generalizeCompany) are dropped, on a copy of the
+        data, whose attributes then replace those of this instance.
+        The attributes are replaced one at a time, so a thread querying
+        this instance meanwhile may see some old and some new ones: to
+        update data shared by threads, use StocksHolder, which swaps whole
+        frozen snapshots (see Stocks.freeze).
+
+        The file is a csv with a ticker column and any of the columns name
+        (legal name, e.g.: Apple Inc.), industry (industry category, e.g.:
+        Consumer Durables) and one per year (market cap in dollars).
+        Empty cells leave values unchanged, new companies have no market cap
+        available unless given. A ticker repeated in the file keeps its last
+        row, as in the data files. Years after year_end (or before year_start)
+        extend range_years, years in between without data have no market
+        cap available.
+
+        Input:
+         filename: string, path to the csv file (or to its .gz compressed
+                   version)
+
+        Output:
+         res: dictionary, number of companies 'added' and 'changed', and
+              list of 'years' added
+
+        Example:
+         # update.csv:
+         # ticker,name,industry,2019
+         # AAPL,,,1300000000000
+         # NEWC,NewCo Inc,Internet,500000000
+         self.applyUpdate('update.csv')
+         # {'added': 1, 'changed': 1, 'years': ['2019']}
+        """
+        self.__check_mutable__()
+        with _UPDATE_LOCK:
+            update = self.__timed__('loadUpdate', parser.loadUpdate, filename)
+            new = type(self).__new__(type(self))
+            new.__dict__.update(self.__dict__)
+            res = new.__timed__('update_columns', new.__update_columns__,
+                                *update)
+            new.__timed__('update_structures', new.__update_structures__,
+                          res['added'], res['changed'], res['renamed'],
+                          res['years'])
+            # replace the attributes, then drop those the copy dropped
+            # (e.g.: cached results)
+            self.__dict__.update(new.__dict__)
+            for name in self.__dict__.keys() - new.__dict__.keys():
+                self.__dict__.pop(name, None)
+        return dict(added=len(res['added']), changed=len(res['changed']),
+                    years=res['years'])
+
+    def __build_lexicon__(self, columnar):
+        """
+        Stores the properties of the data loaded in the columns
+        (see Stocks.__build_columns__). The contents and the helper
+        structures are built on first use (see Stocks.__getattr__).
+        """
+        self.columnar = columnar
 
         # Store number of stocks, years and range of the data
-        self.total_tickers = len(ticker)
-        self.total_years = len(year)
-        self.year_start = int(year[0])
-        self.year_end = int(year[-1])
+        self.total_tickers = len(self.tickers)
+        self.total_years = len(self.years)
+        self.year_start = int(self.years[0])
+        self.year_end = int(self.years[-1])
         self.range_years = range(self.year_start, self.year_end + 1)
 
-        # generate helper dictionaries
-        self.__build_list_of_names__()  # list of all company names
-        self.__build_name_ticker_dict__()  # maps company name to ticker
+    def __getattr__(self, name):
+        """
+        Builds a helper structure the first time it is accessed
+        (see Stocks._LAZY) and records how long it took in self.buildTimes.
+        Only called when the attribute does not exist yet, so reading
+        structures already built takes no lock.
+        """
+        builder = Stocks._LAZY.get(name)
+        if builder is None:
+            raise AttributeError(
+                f"'{type(self).__name__}' object has no attribute '{name}'")
+        with _BUILD_LOCK:
+            # another thread may have built it while this one waited
+            if name not in self.__dict__:
+                self.__timed__(builder.strip('_'), getattr(self, builder))
+        return self.__dict__[name]
+
+    def __setattr__(self, name, value):
+        self.__check_mutable__()
+        object.__setattr__(self, name, value)
+
+    def __delattr__(self, name):
+        self.__check_mutable__()
+        object.__delattr__(self, name)
+
+    def __check_mutable__(self):
+        """
+        Raises AttributeError if this instance is a frozen snapshot
+        (see Stocks.freeze).
+        """
+        if self._frozen:
+            raise AttributeError('A frozen Stocks snapshot cannot be '
+                                 'changed, change a copy from Stocks.thaw '
+                                 'and freeze it again')
+
+    def __timed__(self, stage, function, *args):
+        """
+        Calls function(*args) and stores its running time (seconds) in
+        self.buildTimes under the name of the stage.
+        """
+        start = time.perf_counter()
+        result = function(*args)
+        seconds = time.perf_counter() - start
+        self.__dict__.setdefault('buildTimes', dict())[stage] = seconds
+        if self._instrumentation is not None:
+            self._instrumentation.record(stage, seconds)
+        return result
+
+    def enableInstrumentation(self, hook=None):
+        """
+        Starts recording the calls to the public methods of this instance
+        (see Stocks._INSTRUMENTED): number of calls, exceptions raised,
+        latency histograms and, for generalizeCompany, whether companies
+        were found by ticker, by name or not found. The time taken by the
+        load stages and by the helper structures (see Stocks.buildTimes) is
+        recorded as well. Read the records with Stocks.stats.
+        Instrumentation is off by default and costs nothing while off.
+
+        Input:
+         hook: function or None, called after each recorded event with the
+               arguments (name, seconds, outcome, error), e.g. to forward
+               them to a metrics system (see lib/instrument.py)
+        """
+        self.disableInstrumentation()
+        instrumentation = Instrumentation(hook)
+        for stage, seconds in self.buildTimes.items():
+            instrumentation.record(stage, seconds)
+        self.__instrument__(instrumentation)
+
+    def __instrument__(self, instrumentation):
+        """
+        Wraps the public methods of this instance (see Stocks._INSTRUMENTED)
+        so that their calls are recorded by an Instrumentation.
+        """
+        for name in Stocks._INSTRUMENTED:
+            setattr(self, name,
+                    instrumentation.wrap(name, getattr(self, name)))
+        self._instrumentation = instrumentation
+
+    def disableInstrumentation(self):
+        """
+        Stops recording calls (see Stocks.enableInstrumentation) and
+        discards the records.
+        """
+        self.__check_mutable__()
+        for name in Stocks._INSTRUMENTED:
+            self.__dict__.pop(name, None)
+        self.__dict__.pop('_instrumentation', None)
+
+    def stats(self):
+        """
+        Returns a snapshot of the instrumentation records
+        (see Stocks.enableInstrumentation).
+
+        Output:
+         res: dictionary, maps each method or load stage to a dictionary
+              with calls, errors (per exception type), outcomes, total,
+              mean, minimum and maximum seconds, approximate p50 and p99
+              seconds and a latency histogram (see lib/instrument.py).
+              Empty if instrumentation is disabled.
+        """
+        if self._instrumentation is None:
+            return dict()
+        return self._instrumentation.stats()
+
+    def buildAll(self):
+        """
+        Builds all helper structures now instead of on first use
+        (see Stocks._LAZY). Useful before sharing the instance with other
+        threads or processes. The time taken by each structure is stored in
+        self.buildTimes.
+        """
+        for name in Stocks._LAZY:
+            getattr(self, name)
+
+    def freeze(self):
+        """
+        Returns a frozen snapshot of this instance: a copy sharing its data,
+        with all helper structures built, that cannot be changed. Lookups
+        only read a snapshot, so a single snapshot can serve any number of
+        threads without locks (also on free-threaded Python builds).
+        The data is changed on a mutable copy (see Stocks.thaw), which is
+        frozen again and swapped in for the previous snapshot
+        (see StocksHolder). Instrumentation, if enabled, is carried over.
+
+        Output:
+         stocks: frozen instance of Stocks
+
+        Example:
+         snapshot = Stocks().freeze()
+         snapshot.generalizeCompany('AAPL')  # from any thread
+        """
+        frozen = self.__shallow_copy__()
+        for name in Stocks._LAZY:
+            try:
+                getattr(frozen, name)
+            except ImportError:
+                pass            # fuzzywuzzy not installed, no fuzzy search
+        for value in frozen.__dict__.values():
+            if isinstance(value, np.ndarray):
+                value.flags.writeable = False
+        if self._instrumentation is not None:
+            frozen.__instrument__(self._instrumentation)
+        frozen._frozen = True
+        return frozen
+
+    def thaw(self):
+        """
+        Returns a mutable copy of this instance (e.g.: of a frozen snapshot,
+        see Stocks.freeze) sharing its data and helper structures, which
+        changes such as Stocks.applyUpdate replace instead of modifying.
+        Instrumentation, if enabled, is carried over.
+
+        Output:
+         stocks: instance of Stocks
+        """
+        stocks = self.__shallow_copy__()
+        if self._instrumentation is not None:
+            stocks.__instrument__(self._instrumentation)
+        return stocks
+
+    def __shallow_copy__(self):
+        """
+        Returns a mutable instance sharing the data and helper structures
+        of this one, but not the caches and the instrumentation, which
+        belong to a single instance.
+        """
+        skip = set(Stocks._INSTRUMENTED) | {
+            '_frozen', '_instrumentation', '_companyCache', '_aggregates'}
+        stocks = type(self).__new__(type(self))
+        stocks.__dict__.update((name, value)
+                               for name, value in self.__dict__.items()
+                               if name not in skip)
+        stocks.buildTimes = dict(self.buildTimes)
+        return stocks
 
     def __repr__(self):
         return '\n'.join((f'Stocks',
@@ -83,23 +490,537 @@ class Stocks:
             for key in self.contents[ticker]:
                 print(f'{key}: {self.contents[ticker][key]}')
         else:
-            return self.contents[ticker][field]
+            return readField(self, self.tickerToRow[ticker], field)
+
+    def __build_columns__(self, ticker, marketcap, year, name, industry):
+        """
+        Constructs the arrays holding the data of all companies, one row
+        per ticker (a ticker repeated in the data keeps its last row):
+        - tickers: ticker symbols
+        - tickerToRow: maps ticker symbols to their row
+        - years: years of the data, yearToColumn maps them to their column
+        - marketcaps: market cap per row (ticker) and column (year)
+        - legalNames: legal name of each row
+        - names: cleared name of each row
+        - industryCodes: index of the industry category of each row
+                         in industryLabels
+        """
+        unique, first = np.unique(ticker, return_index=True)
+        last = len(ticker) - 1 - np.unique(ticker[::-1], return_index=True)[1]
+        order = np.argsort(first)  # keep the order of the data files
+        self.tickers = unique[order]
+        self.tickerToRow = {t: i for i, t in enumerate(self.tickers.tolist())}
+        self.years = list(year)
+        self.yearToColumn = {y: i for i, y in enumerate(self.years)}
+        self.marketcaps = marketcap[last[order]].astype(np.int64)
+        legalNames = [name[t] for t in self.tickers.tolist()]
+        self.legalNames = StringPool.fromStrings(legalNames)
+        # names are cleared without the commas of legal names, as they were
+        # before legal names were parsed with their commas
+        self.names = StringPool.fromStrings(parser.clearNames(
+            [name.replace(',', ' ') for name in legalNames]))
+        self.industryLabels, codes = np.unique(
+            [industry.get(t, '') for t in self.tickers.tolist()],
+            return_inverse=True)
+        self.industryCodes = codes.astype(np.int16)
+
+    def __load_columns__(self, arrays):
+        """
+        Restores the columns (see Stocks.__build_columns__) from the arrays
+        stored in a snapshot (see Stocks.saveSnapshot).
+        """
+        self.tickers = arrays['tickers']
+        self.tickerToRow = {t: i for i, t in enumerate(self.tickers.tolist())}
+        self.years = arrays['years'].tolist()
+        self.yearToColumn = {y: i for i, y in enumerate(self.years)}
+        self.marketcaps = arrays['marketcaps']
+        self.legalNames = StringPool(arrays['legalNames'].tobytes(),
+                                     arrays['legalNameOffsets'])
+        self.names = StringPool(arrays['names'].tobytes(),
+                                arrays['nameOffsets'])
+        self.industryLabels = arrays['industryLabels']
+        self.industryCodes = arrays['industryCodes']
+
+    def __update_columns__(self, ticker, legalName, industry, marketcap,
+                           year):
+        """
+        Replaces the columns (see Stocks.__build_columns__) by new arrays
+        with the changes loaded by parser.loadUpdate applied, the arrays of
+        the columns are never modified in place.
+
+        Output:
+         res: dictionary with
+              - added: list of rows of the companies added
+              - changed: list of rows of the companies changed
+              - renamed: dictionary, maps rows (changed or added) to their
+                         previous cleared name (None for added rows)
+              - years: list of years added
+        """
+        # a ticker repeated in the file keeps its last row
+        unique, first = np.unique(ticker, return_index=True)
+        last = len(ticker) - 1 - np.unique(ticker[::-1], return_index=True)[1]
+        order = np.argsort(first)
+        ticker, source = unique[order].tolist(), last[order]
+        total = self.total_tickers
+        added = [t for t in ticker if t not in self.tickerToRow]
+        tickerToRow = dict(self.tickerToRow)
+        tickerToRow.update((t, total + i) for i, t in enumerate(added))
+        rows = np.array([tickerToRow[t] for t in ticker], dtype=np.intp)
+
+        # years (range_years has no gaps)
+        known = [int(y) for y in self.years] + [int(y) for y in year]
+        years = [str(y) for y in range(min(known), max(known) + 1)]
+        offset = years.index(self.years[0])
+        marketcaps = np.zeros((total + len(added), len(years)), dtype=np.int64)
+        marketcaps[:total, offset:offset + self.total_years] = self.marketcaps
+        yearToColumn = {y: i for i, y in enumerate(years)}
+        for j, y in enumerate(year):
+            values = marketcap[source, j]
+            given = values >= 0
+            marketcaps[rows[given], yearToColumn[y]] = values[given]
+        changed = set(rows[rows < total].tolist())
+
+        # names, empty for added companies without name
+        legalChanges = {row: '' for row in range(total, total + len(added))}
+        if legalName is not None:
+            for row, i in zip(rows.tolist(), source.tolist()):
+                if legalName[i] and (row >= total or
+                                     legalName[i] != self.legalNames[row]):
+                    legalChanges[row] = legalName[i]
+        nameChanges = dict(zip(legalChanges, parser.clearNames(
+            [name.replace(',', ' ') for name in legalChanges.values()]
+        ).tolist())) if legalChanges else dict()
+        renamed = {row: self.names[row] if row < total else None
+                   for row, name in nameChanges.items()
+                   if row >= total or name != self.names[row]}
+        changed.update(row for row in legalChanges if row < total)
+
+        # industry categories, labels are kept sorted and without unused ones
+        codes = np.concatenate([self.industryCodes,
+                                np.zeros(len(added), dtype=np.int16)])
+        labels = self.industryLabels
+        given = [(row, industry[i].replace('_', ' ')) for row, i in
+                 zip(rows.tolist(), source.tolist())] if industry else []
+        given = [(row, label) for row, label in given if label and (
+            row >= total or label != labels[codes[row]])]
+        if given or added:
+            labels = np.union1d(self.industryLabels, [''] + [
+                label for _, label in given]).astype(str)
+            codes = np.searchsorted(labels, self.industryLabels[codes])
+            codes[total:] = np.searchsorted(labels, '')
+            for row, label in given:
+                codes[row] = np.searchsorted(labels, label)
+            changed.update(row for row, _ in given if row < total)
+            used, codes = np.unique(codes, return_inverse=True)
+            labels = labels[used]
+
+        newYears = [y for y in years if y not in self.yearToColumn]
+        self.tickers = np.concatenate([self.tickers,
+                                       np.array(added, dtype='<U15')])
+        self.years = years
+        self.yearToColumn = yearToColumn
+        self.marketcaps = marketcaps
+        self.legalNames = self.legalNames.updated(legalChanges)
+        self.names = self.names.updated(nameChanges)
+        self.industryLabels = labels
+        self.industryCodes = codes.astype(np.int16)
+        self.tickerToRow = tickerToRow
+        self.__build_lexicon__(self.columnar)
+        return dict(added=list(range(total, total + len(added))),
+                    changed=sorted(changed), renamed=renamed, years=newYears)
+
+    def __update_structures__(self, added, changed, renamed, years):
+        """
+        Brings the helper structures already built (see Stocks._LAZY) up to
+        date with the columns changed by Stocks.__update_columns__.
+        Structures are replaced, never modified in place, since they are
+        shared with the instance being updated.
+        """
+        built = set(Stocks._LAZY) & set(self.__dict__)
+        rebuild = set()
+        if 'contents' in built and not self.columnar:
+            if years:
+                rebuild.add('contents')
+            else:
+                contents = dict(self.contents)
+                for row in added + changed:
+                    contents[str(self.tickers[row])] = dict(
+                        zip(self.years, self.marketcaps[row]),
+                        legal_name=self.legalNames[row],
+                        name=self.names[row],
+                        industry=str(self.industryLabels[
+                            self.industryCodes[row]]))
+                self.contents = contents
+        if 'sizeCodes' in built and years:
+            rebuild.add('sizeCodes')
+        elif 'sizeCodes' in built and (added or changed):
+            rows = added + changed
+            sizeCodes = np.zeros(self.marketcaps.shape, dtype=np.int8)
+            sizeCodes[:len(self.sizeCodes)] = self.sizeCodes
+            sizeCodes[rows] = np.searchsorted(
+                _MARKETCAP_BOUNDARY, self.marketcaps[rows], side='right')
+            self.sizeCodes = sizeCodes
+        if '_industryNames' in built:
+            rebuild.add('_industryNames')
+        if '_tickerOrder' in built and added:
+            tickers = self.tickers[added]
+            order = np.argsort(tickers)
+            position = np.searchsorted(self._sortedTickers, tickers[order])
+            self._sortedTickers = np.insert(self._sortedTickers, position,
+                                            tickers[order])
+            self._tickerOrder = np.insert(self._tickerOrder, position,
+                                          np.array(added)[order])
+        if 'allNames' in built and renamed:
+            rows = list(renamed)
+            names = np.array([self.names[row] for row in rows])
+            allNames = np.zeros(self.total_tickers, dtype=np.result_type(
+                self.allNames, names))
+            allNames[:len(self.allNames)] = self.allNames
+            allNames[rows] = names
+            self.allNames = allNames
+        if 'nameToTicker' in built and renamed:
+            # a name repeated by several companies maps to the last one
+            affected = {name for name in renamed.values() if name is not None}
+            affected.update(self.names[row] for row in renamed)
+            nameToTicker = dict(self.nameToTicker)
+            for name in affected:
+                nameToTicker.pop(name, None)
+            rows = np.flatnonzero(np.isin(self.allNames, list(affected)))
+            nameToTicker.update(zip(self.allNames[rows].tolist(),
+                                    self.tickers[rows].tolist()))
+            nameToTicker.update(self.aliases)
+            self.nameToTicker = nameToTicker
+        if 'nameAutomaton' in built and renamed:
+            rebuild.add('nameAutomaton')
+        if 'nameKeys' in built and renamed:
+            rebuild.add('nameKeys')
+        if 'nameIndex' in built and renamed:
+            self.nameIndex = self.nameIndex.updated(
+                {row: self.names[row] for row in renamed})
+        if 'completions' in built and (added or changed or renamed or years):
+            rebuild.add('completions')
+        if '_marketcapOrder' in built and (added or changed or years):
+            rebuild.update(name for name, builder in Stocks._LAZY.items()
+                           if builder == '__build_marketcap_index__')
+        if '_aggregates' in built:
+            self._aggregates = dict()
+        # built again on next use, bound to the instance rather than the copy
+        self.__dict__.pop('_companyCache', None)
+        for name in rebuild:
+            self.__dict__.pop(name, None)
+        for name in rebuild:
+            getattr(self, name)
+
+    def __build_contents__(self):
+        """
+        Constructs the dictionary mapping each ticker to a dictionary with
+        the contents of the company (see Stocks.__call__).
+        For the columnar storage this is a read-only view over the columns.
+        """
+        if self.columnar:
+            self.contents = ContentsView(self)
+            return
+        self.contents = {
+            ticker: dict(zip(self.years, marketcap),
+                         legal_name=legalName,
+                         name=name,
+                         industry=str(self.industryLabels[code]))
+            for ticker, marketcap, legalName, name, code in zip(
+                self.tickers.tolist(), self.marketcaps, self.legalNames,
+                self.names, self.industryCodes)
+        }
+
+    def __build_size_codes__(self):
+        """
+        Constructs the matrix of market cap categories, one row per ticker
+        and one column per year: the index of the category of each market
+        cap in _MARKETCAP_CATEGORIES (see Stocks.categorizeMarketcap).
+        """
+        self.sizeCodes = np.searchsorted(
+            _MARKETCAP_BOUNDARY, self.marketcaps, side='right').astype(np.int8)
+
+    def __build_industry_names__(self):
+        """
+        Constructs the list of industry categories as returned by
+        Stocks.industry (spaces replaced by underscores), indexed by
+        industry codes.
+        """
+        self._industryNames = ['_'.join(label.split(' '))
+                               for label in self.industryLabels.tolist()]
+
+    def __build_daily__(self):
+        """
+        Opens the daily market caps (see lib/daily.py), saved in compressed
+        chunks in the data folder, which are built from marketcap-daily.csv
+        when missing or stale. If the data folder is read-only they are
+        saved in a folder of the system's temporary folder instead, one per
+        data folder, reused by all processes. None if there is no
+        marketcap-daily.csv.
+        """
+        path = self.data_path
+        if not os.path.isfile(parser.dataFile(path, daily.SOURCE)):
+            self.daily = None
+            return
+        filename = f'{path}{_DAILY_FILE}'
+        folder = hashlib.sha1(os.path.abspath(path).encode('utf-8'))
+        fallback = os.path.join(tempfile.gettempdir(),
+                                f'stockslexicon-{folder.hexdigest()[:16]}',
+                                _DAILY_FILE)
+        series = daily.loadDaily(filename, path)
+        if series is None:
+            series = daily.loadDaily(fallback, path)
+        if series is None:
+            data = self.__timed__('loadMarketcapDaily',
+                                  parser.loadMarketcapDaily, path)
+            try:
+                daily.saveDaily(filename, *data, path)
+            except OSError:
+                # stale files there are replaced in place
+                filename = fallback
+                os.makedirs(os.path.dirname(filename), exist_ok=True)
+                daily.saveDaily(filename, *data, path)
+            series = daily.loadDaily(filename, path)
+        self.daily = series
+
+    def __build_ticker_index__(self):
+        """
+        Constructs the sorted array of tickers used to look up many
+        tickers at once (see Stocks.__rows_of_tickers__).
+        """
+        self._tickerOrder = np.argsort(self.tickers)
+        self._sortedTickers = self.tickers[self._tickerOrder]
+
+    def __rows_of_tickers__(self, tickers):
+        """
+        Finds the rows of the lookup arrays that hold the given tickers.
+
+        Input:
+         tickers: numpy array of strings, ticker symbols
+
+        Output:
+         rows: numpy array of ints, row of each ticker (0 when not found)
+         found: numpy array of bools, True where the ticker is known
+        """
+        if len(self._sortedTickers) == 0:
+            return (np.zeros(tickers.shape, dtype=np.intp),
+                    np.zeros(tickers.shape, dtype=bool))
+        position = np.searchsorted(self._sortedTickers, tickers)
+        position = np.minimum(position, len(self._sortedTickers) - 1)
+        found = self._sortedTickers[position] == tickers
+        rows = np.where(found, self._tickerOrder[position], 0)
+        return (rows, found)
+
+    def __build_marketcap_index__(self):
+        """
+        Constructs the indexes used by screening queries (see Stocks.screen),
+        one row per year (column of self.marketcaps):
+        - _marketcapOrder: rows of the companies by increasing market cap
+        - _sortedMarketcaps: market caps in that order
+        - _industryOrder: rows of the companies grouped by industry and by
+                          increasing market cap within each industry
+        - _industryMarketcaps: market caps in that order
+        - _industryBounds: the companies of industry code i are at positions
+                           _industryBounds[i]:_industryBounds[i + 1]
+        """
+        marketcaps = self.marketcaps.T
+        # rows fit in 32 bits, which halves the memory of the indexes
+        order = np.argsort(marketcaps, axis=1, kind='stable').astype(np.int32)
+        self._marketcapOrder = order
+        self._sortedMarketcaps = np.take_along_axis(marketcaps, order, axis=1)
+        # stable sort by industry keeps the market cap order within each one
+        grouped = np.argsort(self.industryCodes[order], axis=1, kind='stable')
+        self._industryOrder = np.take_along_axis(order, grouped, axis=1)
+        self._industryMarketcaps = np.take_along_axis(
+            self._sortedMarketcaps, grouped, axis=1)
+        self._industryBounds = np.searchsorted(
+            np.sort(self.industryCodes), np.arange(len(self.industryLabels) + 1))
+
+    def __industry_code__(self, industry):
+        """
+        Returns the code of an industry category (see Stocks.industry) in
+        self.industryLabels. Raises KeyError if the category is unknown.
+        """
+        # accept categories as returned by Stocks.industry
+        label = industry.replace('_', ' ')
+        code = np.searchsorted(self.industryLabels, label)
+        if code == len(self.industryLabels) or \
+           self.industryLabels[code] != label:
+            raise KeyError(industry)
+        return code
+
+    def __screened__(self, year, industry=None):
+        """
+        Returns the rows and market caps of the companies with market cap
+        available in a year, by increasing market cap, from the screening
+        indexes (see Stocks.__build_marketcap_index__).
+        Raises KeyError if the year or the industry are unknown.
+        """
+        column = self.yearToColumn[str(year)]
+        if industry is None:
+            order = self._marketcapOrder[column]
+            marketcaps = self._sortedMarketcaps[column]
+        else:
+            code = self.__industry_code__(industry)
+            start, stop = self._industryBounds[code:code + 2]
+            order = self._industryOrder[column, start:stop]
+            marketcaps = self._industryMarketcaps[column, start:stop]
+        # market caps not available are stored as 0
+        available = np.searchsorted(marketcaps, 0, side='right')
+        return (order[available:], marketcaps[available:])
+
+    def __build_aggregates__(self):
+        """
+        Constructs the cache of aggregate statistics, filled as they are
+        computed (see Stocks.crossTab and Stocks.sizeMigrations).
+        """
+        self._aggregates = dict()
+
+    def __aggregate__(self, marketcaps, bounds, cuts):
+        """
+        Computes the count, total and median market cap of groups of
+        companies from sorted market caps, without looping over companies.
+
+        Input:
+         marketcaps: numpy array of ints, sorted within each group
+         bounds: numpy array of ints, group i is marketcaps[bounds[i]:
+                 bounds[i + 1]]
+         cuts: list of ints, each group is split into the market caps in
+               [cuts[j], cuts[j + 1]) (the last one has no upper bound)
+
+        Output:
+         count, total, median: numpy arrays of shape (groups, len(cuts)),
+                               the median is nan for empty groups
+        """
+        start = np.array([np.searchsorted(marketcaps[begin:end], cuts) + begin
+                          for begin, end in zip(bounds[:-1], bounds[1:])],
+                         dtype=np.intp).reshape(len(bounds) - 1, len(cuts))
+        stop = np.column_stack([start[:, 1:], bounds[1:]])
+        count = stop - start
+        cumulative = np.concatenate([[0], np.cumsum(marketcaps)])
+        total = cumulative[stop] - cumulative[start]
+        if len(marketcaps) == 0:
+            return (count, total, np.full(count.shape, np.nan))
+        lower = marketcaps[np.minimum(start + (count - 1) // 2,
+                                      len(marketcaps) - 1)]
+        upper = marketcaps[np.minimum(start + count // 2,
+                                      len(marketcaps) - 1)]
+        median = np.where(count > 0, (lower + upper) / 2, np.nan)
+        return (count, total, median)
 
     def __build_name_ticker_dict__(self):
         """
         Constructs a map between company names to company tickers.
         """
-        self.nameToTicker = {v['name']: k for k, v in self.contents.items()}
+        self.nameToTicker = dict(zip(self.names, self.tickers.tolist()))
         # Update company names that are better known by other names
         # For example: Alphabet with ticker GOOG is better known as Google
-        self.nameToTicker['Google'] = 'GOOG'
+        self.nameToTicker.update(self.aliases)
+
+    def __build_aliases__(self):
+        """
+        Loads the other names companies are known by (data/aliases.csv).
+        """
+        self.aliases = parser.loadAliases(self.data_path)
+
+    def __build_name_keys__(self):
+        """
+        Constructs a map between normalized company names
+        (see Stocks.setNameNormalizer) and company tickers, so that variants
+        of a name find the same company as the name itself
+        (see Stocks.__build_name_ticker_dict__). Keys of cleared names and
+        aliases take precedence over keys of legal names, which map to the
+        company of their cleared name. A key of names of different
+        companies (e.g.: 'Graham' and 'Graham Holdings Co') is left out,
+        since variants cannot tell them apart.
+        """
+        normalize = self.nameNormalizer
+        nameToTicker = self.nameToTicker
+        exact = [(normalize(name), ticker)
+                 for name, ticker in nameToTicker.items()]
+        legal = [(normalize(legalName), nameToTicker[name])
+                 for name, legalName in zip(self.names, self.legalNames)]
+        keys = dict()
+        for pairs in (exact, legal):
+            found = dict()
+            for key, ticker in pairs:
+                found.setdefault(key, set()).add(ticker)
+            for key, tickers in found.items():
+                # None marks the keys left out, also for the next names
+                keys.setdefault(key, tickers.pop() if len(tickers) == 1
+                                else None)
+        self.nameKeys = {key: ticker for key, ticker in keys.items()
+                         if key and ticker is not None}
+        # a variant of a name never finds another company than the name
+        assert all(self.nameKeys.get(key, ticker) == ticker
+                   for key, ticker in exact)
+
+    def setNameNormalizer(self, normalizer=None, **rules):
+        """
+        Changes the rules used to match variants of company names
+        (see Stocks.tickerFromName). By default names are matched ignoring
+        case, punctuation, '&' versus 'and', leading 'The' and suffixes
+        such as Inc, Co or Holdings (see lib/names.py).
+
+        Input:
+         normalizer: function or None, maps a name to its key
+                     (default: NameNormalizer with the given rules)
+         rules: keyword arguments of NameNormalizer: case, punctuation,
+                ampersand (bools), suffixes and articles (lists of words)
+
+        Example:
+         self.setNameNormalizer(suffixes=['inc', 'corp'])  # keep Holdings
+        """
+        self.__check_mutable__()
+        if normalizer is None:
+            normalizer = NameNormalizer(**rules)
+        self.nameNormalizer = normalizer
+        self.__dict__.pop('nameKeys', None)
+        self.__dict__.pop('_companyCache', None)
+
+    def __build_name_automaton__(self):
+        """
+        Constructs the automaton used to find company names in text.
+        Covers the cleared names of all companies and their other names
+        (see Stocks.__build_name_ticker_dict__).
+        """
+        self.nameAutomaton = NameAutomaton(self.nameToTicker)
+
+    def __build_name_index__(self):
+        """
+        Constructs the trigram index used to shortlist company names in
+        fuzzy searches (see Stocks.matchNameFuzzy).
+        """
+        self.nameIndex = NgramIndex(self.allNames)
+
+    def __build_completions__(self):
+        """
+        Constructs the prefix index used to complete partial company names
+        and tickers (see Stocks.complete). Covers the cleared names, legal
+        names, aliases and tickers of all companies, ranked by their latest
+        market cap available (a year just added may have few of them).
+        """
+        rows = range(self.total_tickers)
+        pairs = set()
+        for keys in (self.names, self.legalNames, self.tickers.tolist()):
+            pairs.update(zip(map(normalizePrefix, keys), rows))
+        pairs.update((normalizePrefix(alias), self.tickerToRow[ticker])
+                     for alias, ticker in self.aliases.items()
+                     if ticker in self.tickerToRow)
+        pairs = [(key, row) for key, row in pairs if key]
+        available = self.marketcaps != 0
+        last = available.shape[1] - 1 - np.argmax(available[:, ::-1], axis=1)
+        latest = np.where(available.any(axis=1),
+                          self.marketcaps[np.arange(len(last)), last], 0)
+        ranks = np.empty(self.total_tickers, dtype=np.int64)
+        ranks[np.argsort(-latest, kind='stable')] = rows
+        self.completions = PrefixIndex([key for key, _ in pairs],
+                                       [row for _, row in pairs], ranks)
 
     def __build_list_of_names__(self):
         """
         Constructs a list of all company names available.
         """
-        self.allNames = np.array(
-            [self(k, 'name') for k in self.contents.keys()], dtype='<U500')
+        self.allNames = np.array(self.names.toList())
 
     @staticmethod
     def categorizeMarketcap(marketcap):
@@ -113,25 +1034,15 @@ class Stocks:
         - Mega:  200 billion <= market cap
 
         Input:
-         marketcap: numpy array of ints, contains market
+         marketcap: int or numpy array of ints of any shape, contains market
                     capitalizations in dollars
 
         Output:
          categories: numpy array of strings, contains market capitalization
-                     separated by categories
+                     separated by categories (a string for a single int)
         """
-        boundary = np.array([50, 300, 2000, 10000, 200000])*1000000
-        categories = np.array(['Nano', 'Micro', 'Small',
-                               'Mid', 'Large', 'Mega'])
-
-        def categorize(value):
-            i = len(categories) - 1
-            for bound in boundary:
-                if value < bound:
-                    i -= 1
-            return categories[i]
-
-        return np.vectorize(categorize)(marketcap)
+        return _MARKETCAP_CATEGORIES[
+            np.searchsorted(_MARKETCAP_BOUNDARY, marketcap, side='right')]
 
     def size(self, ticker, year='2018'):
         """
@@ -147,11 +1058,66 @@ class Stocks:
          size: string, categorized market cap of the company on a given year
                see self.categorizeMarketcap help for categories
         """
-        return str(self.categorizeMarketcap(self(ticker, str(year))))
+        return _SIZES[self.sizeCodes[self.tickerToRow[ticker],
+                                     self.yearToColumn[str(year)]]]
+
+    def marketcapAsOf(self, ticker, date):
+        """
+        Returns the market cap of a company on a date, from the daily market
+        caps (marketcap-daily.csv): the last one on or before the date.
+        Only the chunk of the series holding the date is read from disk
+        (see lib/daily.py). Raises KeyError if the company has no daily
+        market cap on or before the date.
+
+        Input:
+         ticker: string, ticker symbol of company (e.g.: 'AAPL')
+         date: string (YYYY-MM-DD), datetime.date or numpy datetime64
+
+        Output:
+         marketcap: int, market cap in dollars
+        """
+        if self.daily is None:
+            raise FileNotFoundError(
+                f'No {daily.SOURCE} in {self.data_path} folder')
+        return self.daily.asOf(ticker, date)
+
+    def sizeAsOf(self, ticker, date):
+        """
+        Returns the categorized market capitalization of a company on a
+        date, from the daily market caps (see Stocks.marketcapAsOf).
+
+        Example:
+         self.sizeAsOf('AAPL', '2015-06-30')  # 'Mega'
+        """
+        return _SIZES[bisect.bisect_right(_BOUNDARIES,
+                                          self.marketcapAsOf(ticker, date))]
+
+    def marketcapRange(self, ticker, start=None, end=None):
+        """
+        Returns the daily market caps of a company between two dates
+        (included), reading from disk only the chunks that hold them
+        (see lib/daily.py). Use Stocks.categorizeMarketcap on the market
+        caps for their categories.
+
+        Input:
+         ticker: string, ticker symbol of company (e.g.: 'AAPL')
+         start, end: dates (see Stocks.marketcapAsOf) or None for no bound
+
+        Output:
+         dates: numpy array of datetime64[D]
+         marketcaps: numpy array of int64, market caps in dollars
+        """
+        if self.daily is None:
+            raise FileNotFoundError(
+                f'No {daily.SOURCE} in {self.data_path} folder')
+        return self.daily.read(ticker, start, end)
 
     def tickerFromName(self, name):
         """
         Returns the company ticker given its cleared name.
+        Other variants of the name (e.g.: 'apple inc.'), of the legal name
+        or of aliases (e.g.: 'Google', see data/aliases.csv) are found by
+        their normalized key (see Stocks.setNameNormalizer).
 
         Input:
          name: string, company cleared name (e.g.: 'Apple')
@@ -161,11 +1127,12 @@ class Stocks:
         """
         try:
             return self.nameToTicker[name]
-        except AttributeError:
-            self.__build_name_ticker_dict__()
-            return self.tickerFromName(name)
         except KeyError:
-            raise KeyError
+            pass
+        try:
+            return self.nameKeys[self.nameNormalizer(name)]
+        except KeyError:
+            raise KeyError(name) from None
 
     def sizeFromName(self, name, year='2018'):
         """
@@ -189,11 +1156,30 @@ class Stocks:
         Output:
          allNames: numpy array of strings, contains the name of all companies
         """
-        try:
-            return self.allNames
-        except AttributeError:
-            self.__build_list_of_names__()
-            return self.allNames
+        return self.allNames
+
+    def complete(self, prefix, k=10):
+        """
+        Completes a partial company name or ticker, as typed in a search
+        box. Cleared names, legal names, aliases (see data/aliases.csv) and
+        tickers starting with the prefix are matched ignoring case, and the
+        companies are ranked by their latest market cap available.
+        Uses a prefix index built on first use (see lib/autocomplete.py),
+        rather than scanning all names.
+
+        Input:
+         prefix: string, partial name or ticker (e.g.: 'appl')
+         k: int, maximum number of companies returned
+
+        Output:
+         res: list of tuples (ticker, name), largest companies first
+
+        Example:
+         self.complete('micro', k=3)
+         # [('MSFT', 'Microsoft'), ('MU', 'Micron Technology'), ...]
+        """
+        rows = self.completions.complete(normalizePrefix(prefix), k)
+        return [(str(self.tickers[row]), self.names[row]) for row in rows]
 
     def industry(self, ticker):
         """
@@ -239,7 +1225,8 @@ class Stocks:
         Output:
          industry: string, industry category
         """
-        return '_'.join(self.contents[ticker]['industry'].split(' '))
+        row = self.tickerToRow[ticker]
+        return self._industryNames[self.industryCodes[row]]
 
     def industryFromName(self, name):
         """
@@ -268,7 +1255,21 @@ class Stocks:
          res: tuple, first element is the company size and the
               second is the company industry
         """
-        return (self.size(ticker, str(year)), self.industry(ticker))
+        row = self.tickerToRow[ticker]
+        return (_SIZES[self.sizeCodes[row, self.yearToColumn[str(year)]]],
+                self._industryNames[self.industryCodes[row]])
+
+    def generalizeTickerAsOf(self, ticker, date):
+        """
+        Returns a generalized representation of a company from its
+        ticker symbol, with its size on a date from the daily market caps
+        (see Stocks.generalizeTicker and Stocks.marketcapAsOf).
+
+        Output:
+         res: tuple, first element is the company size and the
+              second is the company industry
+        """
+        return (self.sizeAsOf(ticker, date), self.industry(ticker))
 
     def generalizeName(self, name, year='2018'):
         """
@@ -288,9 +1289,386 @@ class Stocks:
          res: tuple, first element is the company size and the
               second is the company industry
         """
-        return (self.sizeFromName(name, year), self.industryFromName(name))
+        return self.generalizeTicker(self.tickerFromName(name), year)
+
+    def generalizeTickers(self, tickers, years='2018'):
+        """
+        Batch version of Stocks.generalizeTicker: generalizes many ticker
+        symbols at once to their size and industry categories.
+        Unknown tickers (or years outside the data range) do not raise an
+        error, they are flagged in the returned mask instead.
+
+        Input:
+         tickers: list or numpy array of strings, ticker symbols of companies
+         years: string, int or array of them, year of the market cap for
+                each ticker (a single year applies to all tickers)
+
+        Output:
+         size: numpy array of strings, market cap category of each ticker
+               (empty string where the ticker is unknown)
+         industry: numpy array of strings, industry category of each ticker
+                   (empty string where the ticker is unknown)
+         found: numpy array of bools, True where the ticker and year are known
+
+        Example:
+         self.generalizeTickers(['AAPL', 'GOOG', '???'], [2007, 2018, 2018])
+         # (array(['Large', 'Mega', '']), array(['Consumer_Durables',
+         #  'Internet', '']), array([ True,  True, False]))
+        """
+        tickers = np.asarray(tickers, dtype=str)
+        years = np.asarray(years).astype(int)
+        tickers, years = np.broadcast_arrays(tickers, years)
+        rows, found = self.__rows_of_tickers__(tickers)
+        column = years - self.year_start
+        found &= (column >= 0) & (column < self.total_years)
+        size = _MARKETCAP_CATEGORIES[
+            self.sizeCodes[rows, np.where(found, column, 0)]]
+        industry = np.array(self._industryNames)[self.industryCodes[rows]]
+        return (np.where(found, size, ''), np.where(found, industry, ''),
+                found)
+
+    def generalizeNames(self, names, years='2018'):
+        """
+        Batch version of Stocks.generalizeName: generalizes many company
+        names at once to their size and industry categories.
+        See Stocks.generalizeTickers for the output.
+
+        Input:
+         names: list or numpy array of strings, company names (e.g.: 'Apple')
+         years: string, int or array of them, year of the market cap for
+                each name (a single year applies to all names)
+        """
+        names = np.asarray(names, dtype=str)
+        unique, inverse = np.unique(names, return_inverse=True)
+        nameToTicker = self.nameToTicker
+        nameKeys = self.nameKeys
+        normalize = self.nameNormalizer
+        ticker = np.array([nameToTicker.get(name)
+                           or nameKeys.get(normalize(name), '')
+                           for name in unique], dtype=str)
+        return self.generalizeTickers(
+            ticker[inverse].reshape(names.shape), years)
+
+    def generalizeCompanies(self, companies, years='2018'):
+        """
+        Batch version of Stocks.generalizeCompany: generalizes many company
+        names or tickers at once. Each one is looked up as a ticker first
+        and then as a company name.
+
+        Input:
+         companies: list or numpy array of strings, company names or tickers
+         years: string, int or array of them, year of the market cap for
+                each company (a single year applies to all of them)
+
+        Output:
+         result: numpy array of strings, market cap and industry categories
+                 of each company (empty string where the company is unknown)
+
+        Example:
+         self.generalizeCompanies(['AAPL', 'Alphabet', '???'])
+         # array(['MEGA_CONSUMER_DURABLES', 'MEGA_INTERNET', ''])
+        """
+        companies = np.asarray(companies, dtype=str)
+        companies, years = np.broadcast_arrays(companies, np.asarray(years))
+        size, industry, found = self.generalizeTickers(companies, years)
+        if not found.all():
+            names = ~found
+            # exact names only, as in Stocks.generalizeCompany
+            nameToTicker = self.nameToTicker
+            tickers = np.array([nameToTicker.get(name, '')
+                                for name in companies[names].tolist()],
+                               dtype=str)
+            size[names], industry[names], found[names] = \
+                self.generalizeTickers(tickers, years[names])
+        labels = np.char.upper(np.char.add(np.char.add(size, '_'), industry))
+        return np.where(found, labels, '')
+
+    def joinTickers(self, tickers, year='2018'):
+        """
+        Joins a column of ticker symbols of another table (e.g.: trades or
+        positions) with the companies in bulk: finds the row of each ticker
+        (see Stocks.toColumns) and its market cap and industry codes.
+        pandas columns are joined with a hash table, categorical columns
+        (pandas category, pyarrow dictionary) on their categories only,
+        and numpy arrays by binary search (see lib/frames.py).
+
+        Input:
+         tickers: list, numpy array, pandas Series, Index or Categorical, or
+                  pyarrow Array or ChunkedArray of strings, ticker symbols
+         year: string or int, year of the market cap
+
+        Output:
+         res: dictionary with numpy arrays aligned with the tickers
+              - row: int64, row of each ticker (-1 where unknown)
+              - size: int8, index of the market cap category in 'sizes'
+                      (-1 where unknown)
+              - industry: int16, index of the industry category in
+                          'industries' (-1 where unknown)
+              and the labels of the codes
+              - sizes: numpy array of strings, market cap categories
+              - industries: numpy array of strings, industry categories
+                            (see Stocks.industry)
+
+        Example:
+         res = self.joinTickers(trades['ticker'], 2018)
+         trades['size'] = pd.Categorical.from_codes(res['size'], res['sizes'])
+        """
+        column = self.yearToColumn[str(year)]
+        rows = frames.tickerRows(self, tickers)
+        found = rows >= 0
+        return dict(
+            row=rows,
+            size=np.where(found, self.sizeCodes[rows, column], -1).astype(
+                np.int8),
+            industry=np.where(found, self.industryCodes[rows], -1).astype(
+                np.int16),
+            sizes=_MARKETCAP_CATEGORIES.copy(),
+            industries=np.array(self._industryNames))
+
+    def toColumns(self):
+        """
+        Returns the data of all companies as columns, one entry per ticker
+        in the order of the rows of this instance, sharing memory with it
+        instead of copying. The arrays are read-only, and should not be
+        kept across Stocks.applyUpdate, which replaces them.
+        See Stocks.toDataFrame and Stocks.toArrow to wrap them.
+
+        Output:
+         columns: dictionary with
+                  - ticker: numpy array of strings
+                  - legal_name, name: StringPool (see lib/columnar.py)
+                  - industry: numpy array of int16, index of the industry
+                              category in self.industryLabels
+                  - one entry per year (e.g.: '2007'): numpy array of
+                    int64, market caps in dollars (0 if not available)
+        """
+        columns = dict(ticker=self.tickers, legal_name=self.legalNames,
+                       name=self.names, industry=self.industryCodes)
+        columns.update((year, self.marketcaps[:, column])
+                       for year, column in self.yearToColumn.items())
+        for name, column in columns.items():
+            if isinstance(column, np.ndarray):
+                columns[name] = column = column.view()
+                column.flags.writeable = False
+        return columns
+
+    def toDataFrame(self):
+        """
+        Returns the data of all companies as a pandas DataFrame
+        (see Stocks.toColumns), with the industry as a categorical column.
+        Requires pandas.
+        """
+        return frames.toDataFrame(self)
+
+    def toArrow(self):
+        """
+        Returns the data of all companies as a pyarrow Table
+        (see Stocks.toColumns), with the industry as a dictionary column.
+        The names are not copied. Requires pyarrow.
+        """
+        return frames.toArrow(self)
+
+    def screen(self, year='2018', low=None, high=None, industry=None,
+               size=None):
+        """
+        Returns the companies whose market cap in a year is in a range,
+        optionally of a single industry category or market cap category.
+        Companies without market cap available that year are left out.
+        Served from per-year sorted indexes, built on first use, so the
+        time taken depends on the number of companies returned rather than
+        on the number of companies in the data.
+
+        Input:
+         year: string or int, year of the market cap
+         low: int or None, minimum market cap in dollars (inclusive)
+         high: int or None, maximum market cap in dollars (exclusive)
+         industry: string or None, industry category (see Stocks.industry)
+         size: string or None, market cap category (e.g.: 'Small'), further
+               restricts the range (see Stocks.categorizeMarketcap)
+
+        Output:
+         tickers: numpy array of strings, ticker symbols by increasing
+                  market cap
+
+        Example:
+         self.screen(2012, size='Small')  # Small caps in 2012
+         self.screen(2015, 10**9, 2 * 10**9, industry='Banking')
+        """
+        if size is not None:
+            categories = list(_MARKETCAP_CATEGORIES)
+            if size.capitalize() not in categories:
+                raise KeyError(size)
+            i = categories.index(size.capitalize())
+            bounds = [None] + list(_MARKETCAP_BOUNDARY) + [None]
+            if bounds[i] is not None:
+                low = bounds[i] if low is None else max(low, bounds[i])
+            if bounds[i + 1] is not None:
+                high = bounds[i + 1] if high is None else \
+                    min(high, bounds[i + 1])
+        order, marketcaps = self.__screened__(year, industry)
+        start = 0 if low is None else np.searchsorted(marketcaps, low)
+        stop = len(order) if high is None else np.searchsorted(marketcaps, high)
+        return self.tickers[order[start:max(start, stop)]]
+
+    def topCompanies(self, year='2018', n=10, industry=None):
+        """
+        Returns the largest companies by market cap in a year, optionally
+        of a single industry category (see Stocks.screen).
+
+        Input:
+         year: string or int, year of the market cap
+         n: int, number of companies returned (at most)
+         industry: string or None, industry category (see Stocks.industry)
+
+        Output:
+         tickers: numpy array of strings, ticker symbols by decreasing
+                  market cap
+
+        Example:
+         self.topCompanies(2015, 100)    # top 100 companies in 2015
+        """
+        order, _ = self.__screened__(year, industry)
+        return self.tickers[order[::-1][:max(n, 0)]]
+
+    def screenPercentile(self, year='2018', low=0, high=100, industry=None):
+        """
+        Returns the companies whose market cap in a year ranks between two
+        percentiles, among the companies with market cap available that
+        year (of a single industry category if given, see Stocks.screen).
+        A company ranked r-th smallest out of n is at percentile 100 * r / n
+        (r from 0), so the percentiles 0 to 100 return all companies.
+
+        Input:
+         year: string or int, year of the market cap
+         low: float, minimum percentile (inclusive)
+         high: float, maximum percentile (exclusive)
+         industry: string or None, industry category (see Stocks.industry)
+
+        Output:
+         tickers: numpy array of strings, ticker symbols by increasing
+                  market cap
+
+        Example:
+         self.screenPercentile(2018, 90)  # top decile in 2018
+        """
+        order, _ = self.__screened__(year, industry)
+        start = int(np.ceil(max(low, 0) * len(order) / 100))
+        stop = int(np.ceil(min(high, 100) * len(order) / 100))
+        return self.tickers[order[start:max(start, stop)]]
+
+    def crossTab(self, year='2018', by=('industry', 'size')):
+        """
+        Returns the number of companies, their total and their median
+        market cap in a year, grouped by industry category, by market cap
+        category, or by both. Companies without market cap available that
+        year are left out.
+        Computed from the screening indexes (see Stocks.screen), in which
+        every group is a contiguous range of sorted market caps, and cached
+        per year until the data changes (see Stocks.applyUpdate).
+
+        Input:
+         year: string or int, year of the market cap
+         by: string or tuple, 'industry', 'size' or ('industry', 'size')
+
+        Output:
+         res: dictionary with
+              - industries: numpy array of strings, industry categories
+                            (see Stocks.industry), when grouped by industry
+              - sizes: numpy array of strings, market cap categories
+                       (see Stocks.categorizeMarketcap), when grouped by size
+              - count: numpy array of ints, number of companies per group
+              - total: numpy array of ints, total market cap per group
+              - median: numpy array of floats, median market cap per group
+                        (nan for empty groups)
+              The arrays have one axis per grouping, in the order of by,
+              and are read-only.
+
+        Example:
+         tab = self.crossTab(2018)
+         tab['count'][:, list(tab['sizes']).index('Mega')]  # per industry
+        """
+        by = (by,) if isinstance(by, str) else tuple(by)
+        if by not in (('industry',), ('size',), ('industry', 'size'),
+                      ('size', 'industry')):
+            raise ValueError(f'Cannot group by {by}')
+        column = self.yearToColumn[str(year)]
+        key = ('crossTab', column, by)
+        if key not in self._aggregates:
+            # 1 leaves out the market caps not available (stored as 0)
+            cuts = [1] + list(_MARKETCAP_BOUNDARY) if 'size' in by else [1]
+            if 'industry' in by:
+                marketcaps = self._industryMarketcaps[column]
+                bounds = self._industryBounds
+            else:
+                marketcaps = self._sortedMarketcaps[column]
+                bounds = np.array([0, len(marketcaps)])
+            res = dict(zip(('count', 'total', 'median'),
+                           self.__aggregate__(marketcaps, bounds, cuts)))
+            for name in ('count', 'total', 'median'):
+                if 'industry' not in by:
+                    res[name] = res[name][0]
+                elif 'size' not in by:
+                    res[name] = res[name][:, 0]
+                elif by[0] == 'size':
+                    res[name] = res[name].T
+            if 'industry' in by:
+                res['industries'] = np.array(['_'.join(label.split(' '))
+                                              for label in self.industryLabels])
+            if 'size' in by:
+                res['sizes'] = _MARKETCAP_CATEGORIES.copy()
+            for array in res.values():
+                array.flags.writeable = False
+            self._aggregates[key] = res
+        return dict(self._aggregates[key])
 
-    def generalizeNameFuzzy(self, name, year='2018'):
+    def sizeMigrations(self, yearFrom, yearTo, industry=None):
+        """
+        Returns how many companies moved between market cap categories from
+        one year to another, optionally of a single industry category.
+        Only companies with market cap available in both years are counted.
+        Cached per pair of years until the data changes
+        (see Stocks.applyUpdate).
+
+        Input:
+         yearFrom: string or int, first year
+         yearTo: string or int, second year
+         industry: string or None, industry category (see Stocks.industry)
+
+        Output:
+         res: dictionary with
+              - sizes: numpy array of strings, market cap categories
+                       (see Stocks.categorizeMarketcap)
+              - count: numpy array of ints, count[i, j] is the number of
+                       companies of category sizes[i] in yearFrom and
+                       sizes[j] in yearTo (read-only)
+
+        Example:
+         migrations = self.sizeMigrations(2007, 2018)
+         migrations['count'][2, 3]       # from Small in 2007 to Mid in 2018
+        """
+        first = self.yearToColumn[str(yearFrom)]
+        second = self.yearToColumn[str(yearTo)]
+        key = ('sizeMigrations', first, second, industry)
+        if key not in self._aggregates:
+            available = (self.marketcaps[:, first] > 0) & \
+                        (self.marketcaps[:, second] > 0)
+            if industry is not None:
+                available &= \
+                    self.industryCodes == self.__industry_code__(industry)
+            sizes = len(_MARKETCAP_CATEGORIES)
+            origin, destination = (np.searchsorted(
+                _MARKETCAP_BOUNDARY, self.marketcaps[available, column],
+                side='right') for column in (first, second))
+            count = np.bincount(origin * sizes + destination,
+                                minlength=sizes * sizes)
+            res = dict(sizes=_MARKETCAP_CATEGORIES.copy(),
+                       count=count.reshape(sizes, sizes))
+            for array in res.values():
+                array.flags.writeable = False
+            self._aggregates[key] = res
+        return dict(self._aggregates[key])
+
+    def generalizeNameFuzzy(self, name, year='2018', threshold=95):
         """
         Returns a generalized representation of a company from its
         name. Uses fuzzy search to match company name.
@@ -299,31 +1677,51 @@ class Stocks:
                         (see Stocks.categorizeMarketcap for categories)
         - Company industry: industry category
                         (see Stocks.industry for categories)
+        Raises ValueError if no company name is similar enough.
 
         Input:
          ticker: string, company name (e.g.: 'Apple')
          year: string or int, year of the market cap
+         threshold: int, minimum similarity score (from 0 to 100)
 
         Output:
          res: tuple, first element is the company size and the
               second is the company industry
         """
-        try:
-            res = process.extractOne(name, self.allNames)
-        except AttributeError:
-            self.__build_list_of_names__()
-            return self.generalizeNameFuzzy(name, year)
-        else:
-            if res[1] >= 95:    # scores go from 0 to 100, 95 is the chosen threshold
-                return (self.sizeFromName(res[0], year),
-                        self.industryFromName(res[0]))
-            else:
-                raise ValueError
+        res = self.matchNameFuzzy(name, 1, threshold)
+        if not res:
+            raise ValueError
+        return (self.sizeFromName(res[0][0], year),
+                self.industryFromName(res[0][0]))
+
+    def matchNameFuzzy(self, name, limit=5, threshold=95):
+        """
+        Finds the company names most similar to a name, using the same
+        scores as fuzzywuzzy's process.extract (from 0 to 100).
+        Only names that can reach the threshold are scored
+        (see lib/fuzzy.py), the result is the same as scoring all names.
+
+        Input:
+         name: string, company name (e.g.: 'Aple')
+         limit: int, maximum number of names returned
+         threshold: int, minimum similarity score of names returned
+
+        Output:
+         res: list of tuples (name, score) sorted by decreasing score
+
+        Example:
+         self.matchNameFuzzy('Microsfot', limit=1, threshold=80)
+         # [('Microsoft', 89)]
+        """
+        return self.nameIndex.extract(name, limit, threshold)
 
     def findNameInString(self, string):
         """
         Finds name of a company in a string and returns the range of indices
         to get that name.
+        Names only match whole words. If more than one name is found, the
+        leftmost one is returned (the longest one if several start at the
+        same position).
 
         Input:
          string: string, contains sequence of words separated by whitespace
@@ -333,12 +1731,29 @@ class Stocks:
                  the company name in the original string. That is, if you call
                  string[result] you will get the company name that was found.
         """
-        for name in self.allNames:
-            if name in string:
-                starts_at = string.index(name)
-                ends_at = starts_at + len(name)
-                return slice(starts_at, ends_at)
-        return None
+        match = self.nameAutomaton.findFirst(string)
+        return None if match is None else match[0]
+
+    def findNamesInString(self, string):
+        """
+        Finds all company names in a string in a single pass.
+        Names only match whole words and do not overlap: when two names
+        overlap, the leftmost one is kept (the longest one if both start at
+        the same position).
+
+        Input:
+         string: string, contains sequence of words separated by whitespace
+
+        Output:
+         result: list of tuples (slice, ticker) sorted by position. Calling
+                 string[slice] gives the company name that was found and
+                 ticker is the ticker symbol of that company.
+
+        Example:
+         self.findNamesInString('Apple and Microsoft')
+         # [(slice(0, 5), 'AAPL'), (slice(10, 19), 'MSFT')]
+        """
+        return self.nameAutomaton.findAll(string)
 
     def generalizeCompany(self, ticker_or_name, year='2018'):
         """
@@ -350,72 +1765,244 @@ class Stocks:
         Output:
          result: string or None, if ticker_or_name contains the name or ticker
                  of some company, then returns its market cap and industry categories
+
+        Names are matched exactly (cleared names and aliases), since this is
+        applied to every word of texts: variants of names
+        (see Stocks.tickerFromName) would match common words.
+
+        The results, including companies not found, are remembered for the
+        most recent tokens and years (see Stocks.setCompanyCacheSize).
+        """
+        res, outcome = self._companyCache(ticker_or_name, str(year))
+        if self._instrumentation is not None:
+            self._instrumentation.count('generalizeCompany', outcome)
+        return res
+
+    def __generalize_company__(self, ticker_or_name, year):
         """
-        res = None
+        Generalizes a company name or ticker (see Stocks.generalizeCompany)
+        and tells how it was found: by 'ticker', by 'name' or 'miss'.
+        """
+        try:
+            return ('_'.join(self.generalizeTicker(ticker_or_name, year)).upper(),
+                    'ticker')
+        except KeyError:
+            pass
+        # exact names only: the variants matched by Stocks.tickerFromName
+        # would turn common words (e.g.: 'target') into companies
         try:
-            res = '_'.join(self.generalizeTicker(ticker_or_name, year)).upper()
+            ticker = self.nameToTicker[ticker_or_name]
         except KeyError:
+            return (None, 'miss')
+        return ('_'.join(self.generalizeTicker(ticker, year)).upper(), 'name')
+
+    def __build_company_cache__(self):
+        """
+        Constructs the cache of the results of Stocks.generalizeCompany,
+        which keeps the most recently used tokens and years.
+        """
+        self._companyCache = functools.lru_cache(self.companyCacheSize)(
+            self.__generalize_company__)
+
+    def setCompanyCacheSize(self, size):
+        """
+        Changes how many results of Stocks.generalizeCompany are remembered
+        (the least recently used are dropped first), and empties the cache.
+
+        Input:
+         size: int, number of (token, year) results, 0 disables the cache
+               and None removes the limit
+        """
+        self.__check_mutable__()
+        self.companyCacheSize = size
+        self.__dict__.pop('_companyCache', None)
+
+    def companyCacheInfo(self):
+        """
+        Returns the statistics of the cache of Stocks.generalizeCompany
+        since it was last emptied (e.g.: by Stocks.applyUpdate).
+
+        Output:
+         res: dictionary with hits, misses (lookups that were computed),
+              size (results remembered), maxsize and hit_rate
+        """
+        info = self._companyCache.cache_info()
+        lookups = info.hits + info.misses
+        return dict(hits=info.hits, misses=info.misses, size=info.currsize,
+                    maxsize=info.maxsize,
+                    hit_rate=info.hits / lookups if lookups else 0.0)
+
+    def __generalizer__(self, year='2018'):
+        """
+        Returns a function that generalizes the company names and tickers
+        in a string (see Stocks.generalizeString) for a given year.
+        The function remembers the generalization of each company it has
+        already seen, so it should be reused for all strings of a corpus.
+        """
+        year = str(year)
+        labels = dict()         # ticker -> generalized company
+
+        def label(ticker):
             try:
-                res = '_'.join(self.generalizeName(ticker_or_name, year)).upper()
+                return labels[ticker]
             except KeyError:
-                pass
-        return res
+                labels[ticker] = '_'.join(
+                    self.generalizeTicker(ticker, year)).upper()
+                return labels[ticker]
+
+        def replaceTicker(word):
+            word = word.group()
+            # skip single letters, they are usually not tickers
+            if len(word) > 1 and word in self.tickerToRow:
+                return label(word)
+            return word
+
+        def generalize(string):
+            parsed = []
+            position = 0
+            for match, ticker in self.nameAutomaton.findAll(string):
+                parsed.append(_WORD.sub(replaceTicker,
+                                        string[position:match.start]))
+                parsed.append(label(ticker))
+                position = match.stop
+            parsed.append(_WORD.sub(replaceTicker, string[position:]))
+            return ''.join(parsed)
+
+        return generalize
+
+    def generalizeString(self, string, year='2018'):
+        """
+        Parses a string applying the following generalization:
+        - company names and ticker symbols (excluding tickers with a single
+          letter) are replaced by the company's market cap and industry
+          categories (see Stocks.generalizeCompany)
+        - everything else, including whitespace, is kept as is
+        The string is scanned once from left to right.
+
+        Input:
+         string: string, a string which may contain the name/ticker of
+                 companies
+         year: string, contains year from which to recover the market cap
+               category
+
+        Output:
+         result: string, contains original string but with company names and
+                 tickers substituted by their respective market cap and
+                 industry categories
+
+        Example:
+         self.generalizeString('Apple buys AMZN')
+         # 'MEGA_CONSUMER_DURABLES buys MEGA_RETAIL'
+        """
+        return self.__generalizer__(year)(string)
+
+    def generalizeStream(self, source, year='2018', encoding='utf-8'):
+        """
+        Generalizes a corpus one line (or document) at a time, without
+        loading it into memory (see Stocks.generalizeString).
+
+        Input:
+         source: iterable of strings (lines or documents), or path to a
+                 text file which is read line by line (gzip compressed if
+                 the file name ends in .gz)
+         year: string, contains year from which to recover the market cap
+               category
+         encoding: string, encoding of the text file
+
+        Output:
+         result: generator of strings, each line (or document) of the corpus
+                 generalized, in the same order
+
+        Example:
+         for line in self.generalizeStream('news.txt', 2015):
+             print(line, end='')
+        """
+        generalize = self.__generalizer__(year)
+        for document in parser.readCorpus(source, encoding):
+            yield generalize(document)
+
+    def generalizeParallel(self, source, year='2018', processes=None,
+                           chunksize=1000, stats=None, encoding='utf-8'):
+        """
+        Generalizes a corpus like Stocks.generalizeStream, but splits it in
+        chunks of lines that are generalized by a pool of worker processes.
+        Where available, the workers are forked and share this instance
+        (copy-on-write) instead of loading the data again; otherwise they
+        load it from a snapshot (see Stocks.saveSnapshot).
 
-    # def generalizeTickersInString(self, string, year='2018'):
-    #     """
-    #     Takes a string without company names and generalizes each of its words.
-    #     If the word is a ticker symbol,
-    #     excluding tickers with a single letter, then it is generalized to the
-    #     company market cap and industry categories.
-    #     If the word is not a ticker symbol, then it is not modified.
-    #     """
-    #     parsed = ''
-    #     for word in string.split(' '):
-    #         # skip single letters
-    #         if len(word) != 1:
-    #             try:
-    #                 parsed += self.generalizeCompany(word, year)
-    #             except TypeError:
-    #                 parsed += word
-    #             finally:
-    #                 parsed += ' '
-    #     return parsed.strip()
-
-
-    # def generalizeString(self, string, year='2018'):
-    #     """
-    #     Parses a string applying the following generalization:
-    #     - Stocks-Lexicon: generalize company names to market cap (6 categories)
-    #                  (there are about ___ companies which are mapped
-    #                   to ___ market cap categories) and industry category
-
-    #     Input:
-    #      string: string, a string which may contain the name/ticker of companies
-    #      year: string, contains year from which to recover the market cap category
-
-    #     Output:
-    #      result: string, contains original string but with company names and tickers
-    #              substituted by their respective market cap and industry categories
-    #     """
-    #     # find company names
-    #     indices = self.findNameInString(string)
-    #     # if there are no company names, then generalize tickers
-    #     if indices == None:
-    #         return self.generalizeTickersInString(string, year)
-    #     else:                       # there is a company name in the string
-    #         company = self.generalizeCompany(string[indices], year)
-    #         # get substrings around the company name
-    #         before = string[:indices.start]
-    #         after = string[indices.stop:]
-    #         if len(before) == 0 and len(after) == 0:
-    #             return f'{company}'
-    #         elif len(before) == 0 and len(after) != 0:
-    #             after_parsed = self.generalizeString(after, year)
-    #             return f'{company} {after_parsed}'
-    #         elif len(before) != 0 and len(after) == 0:
-    #             before_parsed = self.generalizeString(before, year)
-    #             return f'{before_parsed} {company}'
-    #         elif len(before) != 0 and len(after) != 0:
-    #             before_parsed = self.generalizeString(before, year)
-    #             after_parsed = self.generalizeString(after, year)
-    #             return f'{before_parsed} {company} {after_parsed}'
+        Input:
+         source: iterable of strings (lines or documents), or path to a
+                 text file which is read line by line (gzip compressed if
+                 the file name ends in .gz)
+         year: string, contains year from which to recover the market cap
+               category
+         processes: int, number of worker processes (default: number of cpus)
+         chunksize: int, number of lines sent to a worker at a time
+         stats: dictionary or None, if given it is updated with throughput
+                statistics as the corpus is processed: processes, chunks,
+                lines, characters, seconds and lines_per_second
+         encoding: string, encoding of the text file
+
+        Output:
+         result: generator of strings, each line (or document) of the corpus
+                 generalized, in the same order as the input
+
+        Example:
+         stats = dict()
+         with open('news-generalized.txt', 'w') as out:
+             out.writelines(self.generalizeParallel('news.txt', stats=stats))
+         print(stats['lines_per_second'])
+        """
+        return parallel.generalizeCorpus(self, source, year, processes,
+                                         chunksize, stats, encoding)
+
+
+class StocksHolder:
+    """
+    Holds the current frozen snapshot of the data (see Stocks.freeze) for
+    the threads sharing it, and replaces it in a single step when the data
+    changes. Readers take the current snapshot without locks and are never
+    blocked by updates; a reader that keeps using the same snapshot sees
+    consistent data.
+
+    Example:
+     holder = StocksHolder(Stocks())
+     holder.current.generalizeCompany('AAPL')  # from any thread
+     holder.applyUpdate('update.csv')          # from any thread
+    """
+
+    def __init__(self, stocks):
+        """
+        Input:
+         stocks: instance of Stocks, frozen here if it is not already
+        """
+        self.current = stocks if stocks._frozen else stocks.freeze()
+        self._lock = threading.Lock()
+
+    def swap(self, stocks):
+        """
+        Replaces the current snapshot and returns the previous one.
+
+        Input:
+         stocks: instance of Stocks, frozen here if it is not already
+        """
+        if not stocks._frozen:
+            stocks = stocks.freeze()
+        with self._lock:
+            previous, self.current = self.current, stocks
+        return previous
+
+    def applyUpdate(self, filename):
+        """
+        Applies a file of changes (see Stocks.applyUpdate) to a copy of the
+        current snapshot, and swaps the copy in once frozen. Updates are
+        applied one after the other.
+
+        Output:
+         res: dictionary, see Stocks.applyUpdate
+        """
+        with self._lock:
+            stocks = self.current.thaw()
+            res = stocks.applyUpdate(filename)
+            self.current = stocks.freeze()
+        return res